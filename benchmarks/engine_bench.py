@@ -0,0 +1,165 @@
+"""
+Engine micro-benchmarks. Runs without a network.
+
+    python -m benchmarks.engine_bench                      # run and compare against benchmarks/baseline.json
+    python -m benchmarks.engine_bench --update-baseline    # store the current numbers as the new baseline
+    python -m benchmarks.engine_bench --output results.json --fail-on-regression
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import platform
+from typing import Callable
+
+from engine import BodyEngine
+from population import BodyPopulation
+from prompt_builder import build_reflex_messages, build_persona_messages
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Shaped like real reflex responses: several plugins, signed string deltas
+SAMPLE_IMPACTS = [
+    {"circulatory": {"heart_rate": "+=12.5"}, "endocrine": {"adrenaline": "+=30", "cortisol": "+=5.0"}},
+    {"digestive": {"fullness": "+=15.0", "nutrient_buffer": "+=3"}, "endocrine": {"endorphins": "+=8.0"}},
+    {"respiratory": {"breathing_rate": "+=4"}, "circulatory": {"heart_rate": "-=6.0"}, "endocrine": {"adrenaline": "-=10"}},
+]
+SAMPLE_EVENT = "*a cold wind blows*"
+
+
+def measure(fn: Callable[[], object], min_time: float = 0.2, repeat: int = 5) -> float:
+    """Returns the best observed calls per second of `fn` over `repeat` timed batches."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 4:
+            break
+        number *= 4
+
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        best = max(best, number / elapsed)
+    return best
+
+
+def tick_engines(engines: list[BodyEngine]) -> Callable[[], None]:
+    def tick():
+        for engine in engines:
+            # Force a full one-second tick regardless of wall-clock resolution
+            engine.last_update_time -= 1.0
+            engine.update()
+    return tick
+
+
+def run_benchmarks(body_counts: list[int]) -> dict[str, dict[str, float]]:
+    results: dict[str, dict[str, float]] = {}
+
+    def record(name: str, calls_per_sec: float, items_per_call: int = 1):
+        results[name] = {
+            "ops_per_sec": calls_per_sec * items_per_call,
+            "us_per_op": 1e6 / (calls_per_sec * items_per_call),
+        }
+        print(f"{name:<40} {results[name]['ops_per_sec']:>14,.0f} ops/s {results[name]['us_per_op']:>12.3f} us/op")
+
+    for count in body_counts:
+        engines = [BodyEngine() for _ in range(count)]
+        record(f"engine_update_bodies_{count}", measure(tick_engines(engines)), count)
+
+        population = BodyPopulation(capacity=count)
+        population.add_bodies(count)
+        record(f"population_step_bodies_{count}", measure(lambda: population.step(1.0)), count)
+
+    engine = BodyEngine()
+    impacts = itertools.cycle(SAMPLE_IMPACTS)
+    record("apply_impact", measure(lambda: engine.apply_impact(next(impacts))))
+    population = BodyPopulation(capacity=1)
+    population.add_body()
+    record("population_apply_impact", measure(lambda: population.apply_impact(0, next(impacts))))
+
+    engine = BodyEngine()
+    record("get_all_sensations", measure(engine.get_all_sensations))
+    record("get_full_state", measure(engine.get_full_state))
+    record("get_raw_state", measure(engine.get_raw_state))
+    record("get_organs_schema", measure(engine.get_organs_schema))
+    record(
+        "build_reflex_prompt",
+        measure(lambda: build_reflex_messages(SAMPLE_EVENT, engine.get_raw_state(), engine.get_organs_schema())),
+    )
+    record(
+        "build_persona_prompt",
+        measure(lambda: build_persona_messages(SAMPLE_EVENT, SAMPLE_IMPACTS[0], engine.get_raw_state(), engine.get_all_sensations())),
+    )
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Prints the change against the baseline and returns the names of regressed benchmarks."""
+    regressions = []
+    print(f"\n{'benchmark':<40} {'baseline':>14} {'current':>14} {'change':>9}")
+    for name, current in results.items():
+        if name not in baseline:
+            print(f"{name:<40} {'-':>14} {current['ops_per_sec']:>14,.0f} {'new':>9}")
+            continue
+        base_ops = baseline[name]["ops_per_sec"]
+        change = current["ops_per_sec"] / base_ops - 1.0
+        flag = ""
+        if change < -tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<40} {base_ops:>14,.0f} {current['ops_per_sec']:>14,.0f} {change:>+9.1%}{flag}")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="ChatRPG engine micro-benchmarks")
+    parser.add_argument("--bodies", type=int, nargs="+", default=[1, 100, 10_000], help="body counts for the tick benchmarks")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results to the baseline file")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a benchmark counts as regressed")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 if any benchmark regressed")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": run_benchmarks(args.bodies),
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one.")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(report["results"], baseline, args.tolerance)
+    if regressions and args.fail_on_regression:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+End-to-end load generator for the reflex -> apply_impact -> persona turn pipeline.
+
+    python -m benchmarks.mock_llm_server --port 8089 &
+    python -m benchmarks.loadgen --api-base http://127.0.0.1:8089/v1 --rate 20 --duration 30 --bodies 200
+
+Turns arrive as a Poisson process at `--rate` per second, each against a random body of a BodyPopulation,
+and run through the same pipeline functions the TUI uses.
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+import llm_services
+from metrics import metrics
+from pipeline import run_turn
+from population import BodyPopulation
+from reflex_cache import ReflexCache
+from reflex_batcher import ReflexBatcher
+
+SAMPLE_EVENTS = [
+    "*eats an apple*",
+    "*a cold wind blows*",
+    "*hears a loud bang behind her*",
+    "*gets a warm hug*",
+    "*runs up a flight of stairs*",
+    "今天过得怎么样？",
+]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_load(rate: float, duration: float, bodies: int, stream: bool, use_cache: bool, batch: bool, seed: int | None) -> dict:
+    rng = random.Random(seed)
+    population = BodyPopulation(capacity=bodies)
+    population.add_bodies(bodies)
+    reflex_cache = ReflexCache(disk_path=None) if use_cache else None
+    batcher = ReflexBatcher() if batch else None
+
+    latencies: list[float] = []
+    first_token_latencies: list[float] = []
+    errors = 0
+
+    async def one_turn(body_id: int, event: str):
+        nonlocal errors
+        start = time.perf_counter()
+        first_token_at = None
+
+        def on_token(_token: str):
+            nonlocal first_token_at
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+
+        try:
+            result = await run_turn(
+                population.body(body_id), event, reflex_cache,
+                on_token=on_token, stream=stream, batcher=batcher, body_key=str(body_id)
+            )
+            if result.persona_response.startswith("[Error") or result.persona_response.startswith("[ERROR"):
+                errors += 1
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+        if first_token_at is not None:
+            first_token_latencies.append(first_token_at - start)
+
+    await llm_services.client_manager.open()
+    tasks = []
+    started = time.perf_counter()
+    next_arrival = started
+    try:
+        while next_arrival - started < duration:
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            tasks.append(asyncio.create_task(one_turn(rng.randrange(bodies), rng.choice(SAMPLE_EVENTS))))
+            next_arrival += rng.expovariate(rate)
+        await asyncio.gather(*tasks)
+    finally:
+        await llm_services.client_manager.close()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    first_token_latencies.sort()
+    report = {
+        "turns": len(latencies),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_turns_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+    }
+    if first_token_latencies:
+        report["first_token_latency_s"] = {
+            "p50": percentile(first_token_latencies, 50),
+            "p95": percentile(first_token_latencies, 95),
+            "p99": percentile(first_token_latencies, 99),
+        }
+    if reflex_cache is not None:
+        report["reflex_cache"] = reflex_cache.stats()
+    if metrics.counters:
+        report["events"] = dict(metrics.counters)
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="ChatRPG end-to-end turn load generator")
+    parser.add_argument("--api-base", help="override OPENAI_API_BASE, e.g. the mock server's http://127.0.0.1:8089/v1")
+    parser.add_argument("--api-key", default=None, help="override OPENAI_API_KEY (any value works against the mock)")
+    parser.add_argument("--rate", type=float, default=10.0, help="target turns per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to keep generating turns")
+    parser.add_argument("--bodies", type=int, default=100, help="number of simulated bodies")
+    parser.add_argument("--no-stream", action="store_true", help="use the non-streaming persona call")
+    parser.add_argument("--cache", action="store_true", help="put the reflex cache in front of reflex calls")
+    parser.add_argument("--batch", action="store_true", help="share reflex calls between bodies through a ReflexBatcher")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if args.api_base:
+        llm_services.API_BASE_URL = args.api_base
+        if args.api_key is None and not llm_services.API_KEY:
+            llm_services.API_KEY = "mock"
+    if args.api_key is not None:
+        llm_services.API_KEY = args.api_key
+
+    report = asyncio.run(run_load(args.rate, args.duration, args.bodies, not args.no_stream, args.cache, args.batch, args.seed))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
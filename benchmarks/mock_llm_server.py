@@ -0,0 +1,250 @@
+"""
+A local stand-in for an OpenAI-compatible `/chat/completions` endpoint.
+
+    python -m benchmarks.mock_llm_server --port 8089 --latency-dist lognormal --latency-ms 400
+    OPENAI_API_BASE=http://127.0.0.1:8089/v1 OPENAI_API_KEY=mock uv run python main.py
+
+Reflex requests (those asking for a JSON response) get impacts that are valid against the organ schema
+embedded in their system prompt, or against the `json_schema` response format when one is sent.
+Persona requests get canned text, streamed over SSE when `stream` is set.
+"""
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+PERSONA_REPLIES = [
+    "唔……好冷，风吹得我直打哆嗦。",
+    "嗯，刚吃完东西，感觉暖暖的，很舒服。",
+    "心跳得好快……刚才那一下真的吓到我了。",
+    "我有点累了，想找个地方坐一会儿。",
+]
+# Used when a reflex prompt carries no schema
+CANNED_IMPACT = {"circulatory": {"heart_rate": 5.0}, "endocrine": {"adrenaline": 10.0}}
+
+_PLUGIN_HEADER = re.compile(r"^## Plugin: (\S+)$", re.MULTILINE)
+_ATTRIBUTE_LINE = re.compile(r"^- (\w+):", re.MULTILINE)
+
+
+class LatencyModel:
+    """Samples response delays in seconds from a configurable distribution."""
+
+    def __init__(self, dist: str, mean_ms: float, spread: float):
+        self.dist = dist
+        self.mean = mean_ms / 1000.0
+        self.spread = spread
+
+    def sample(self) -> float:
+        if self.dist == "fixed":
+            return self.mean
+        if self.dist == "uniform":
+            return random.uniform(self.mean * (1 - self.spread), self.mean * (1 + self.spread))
+        if self.dist == "exponential":
+            return random.expovariate(1.0 / self.mean)
+        # lognormal: median of `mean`, `spread` is sigma; produces a realistic long tail
+        return random.lognormvariate(0.0, self.spread) * self.mean
+
+
+def parse_schema(system_prompt: str) -> dict[str, list[str]]:
+    """Extracts {plugin: [attributes]} from the organ schema inside a reflex system prompt."""
+    schema = {}
+    headers = list(_PLUGIN_HEADER.finditer(system_prompt))
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(system_prompt)
+        schema[header.group(1)] = _ATTRIBUTE_LINE.findall(system_prompt, header.end(), end)
+    return schema
+
+
+def make_reflex_impact(system_prompt: str) -> dict:
+    """Builds a random impact touching one to three schema attributes."""
+    attributes = [(plugin, attr) for plugin, attrs in parse_schema(system_prompt).items() for attr in attrs]
+    if not attributes:
+        return CANNED_IMPACT
+    impact: dict[str, dict[str, float]] = {}
+    for plugin, attr in random.sample(attributes, k=min(len(attributes), random.randint(1, 3))):
+        impact.setdefault(plugin, {})[attr] = round(random.uniform(-15.0, 15.0), 1)
+    return impact
+
+
+def make_structured_reflex_impact(json_schema: dict) -> dict:
+    """Answers a `response_format: json_schema` reflex call: every attribute present, one to three of them non-zero."""
+    impact = {
+        plugin: {attr: 0 for attr in plugin_schema.get("properties", {})}
+        for plugin, plugin_schema in json_schema.get("properties", {}).items()
+    }
+    attributes = [(plugin, attr) for plugin, attrs in impact.items() for attr in attrs]
+    for plugin, attr in random.sample(attributes, k=min(len(attributes), random.randint(1, 3))):
+        impact[plugin][attr] = round(random.uniform(-15.0, 15.0), 1)
+    return impact
+
+
+def make_batch_reflex_impacts(system_prompt: str, user_prompt: str) -> dict:
+    """Answers a batched reflex call with one random impact per body id listed after "[BODIES]:"."""
+    try:
+        bodies = json.loads(user_prompt.split("[BODIES]:", 1)[1])
+    except (IndexError, ValueError):
+        return {}
+    return {str(body["id"]): make_reflex_impact(system_prompt) for body in bodies if isinstance(body, dict) and "id" in body}
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class MockLLMServer:
+    """A minimal HTTP/1.1 server with keep-alive that answers chat completion requests."""
+
+    def __init__(self, latency: LatencyModel, token_interval: float, fail_rate: float = 0.0):
+        self.latency = latency
+        self.token_interval = token_interval
+        self.fail_rate = fail_rate
+        self.requests = 0
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+
+                if method != "POST" or not path.rstrip("/").endswith("/chat/completions"):
+                    await self._send_json(writer, 404, {"error": {"message": f"Unknown route {method} {path}"}})
+                else:
+                    await self._handle_completion(writer, json.loads(body))
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_completion(self, writer: asyncio.StreamWriter, payload: dict):
+        self.requests += 1
+        await asyncio.sleep(self.latency.sample())
+        if self.fail_rate and random.random() < self.fail_rate:
+            await self._send_json(writer, 503, {"error": {"message": "mock upstream overloaded"}})
+            return
+
+        messages = payload.get("messages", [])
+        system_prompt = messages[0]["content"] if messages else ""
+        prompt_tokens = sum(estimate_tokens(m.get("content", "")) for m in messages)
+        user_prompt = messages[-1]["content"] if messages else ""
+        response_format = payload.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            content = json.dumps(make_structured_reflex_impact(response_format["json_schema"]["schema"]), ensure_ascii=False)
+        elif payload.get("response_format") and user_prompt.startswith("[BODIES]:"):
+            content = json.dumps(make_batch_reflex_impacts(system_prompt, user_prompt), ensure_ascii=False)
+        elif payload.get("response_format"):
+            content = json.dumps(make_reflex_impact(system_prompt), ensure_ascii=False)
+        else:
+            content = random.choice(PERSONA_REPLIES)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": estimate_tokens(content),
+            "total_tokens": prompt_tokens + estimate_tokens(content),
+        }
+        completion_id = f"chatcmpl-mock-{self.requests}"
+
+        if not payload.get("stream"):
+            await self._send_json(writer, 200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n"
+        )
+        pieces = [content[i:i + 2] for i in range(0, len(content), 2)]
+        for i, piece in enumerate(pieces):
+            if i:
+                await asyncio.sleep(self.token_interval)
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "model": payload.get("model", "mock"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            await self._send_chunk(writer, f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+        final = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "model": payload.get("model", "mock"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+        await self._send_chunk(writer, f"data: {json.dumps(final)}\n\n")
+        await self._send_chunk(writer, "data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _send_chunk(writer: asyncio.StreamWriter, text: str):
+        data = text.encode("utf-8")
+        writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _send_json(writer: asyncio.StreamWriter, status: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        reason = {200: "OK", 404: "Not Found", 503: "Service Unavailable"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n\r\n".encode("ascii") + data
+        )
+        await writer.drain()
+
+
+async def serve(host: str, port: int, server: MockLLMServer) -> asyncio.Server:
+    return await asyncio.start_server(server.handle_connection, host, port)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "exponential", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="mean (median for lognormal) time to first byte")
+    parser.add_argument("--latency-spread", type=float, default=0.5, help="relative width (uniform) or sigma (lognormal)")
+    parser.add_argument("--token-interval-ms", type=float, default=20.0, help="delay between streamed chunks")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 503")
+    args = parser.parse_args(argv)
+
+    server = MockLLMServer(
+        LatencyModel(args.latency_dist, args.latency_ms, args.latency_spread),
+        args.token_interval_ms / 1000.0,
+        args.fail_rate,
+    )
+
+    async def run():
+        listener = await serve(args.host, args.port, server)
+        print(f"Mock LLM server listening on http://{args.host}:{args.port}/v1")
+        async with listener:
+            await listener.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+import time
+
+
+class WallClock:
+    """Real time, as used by the TUI."""
+
+    def now(self) -> float:
+        return time.time()
+
+
+class VirtualClock:
+    """Simulated time that only moves when advanced, so hours of dynamics can run as fast as the CPU allows."""
+
+    def __init__(self, start: float = 0.0):
+        self.time = start
+
+    def now(self) -> float:
+        return self.time
+
+    def advance(self, seconds: float):
+        self.time += seconds
+
+
+class ScaledClock:
+    """Wall time sped up (or slowed down) by `scale`, starting from the moment the clock is created."""
+
+    def __init__(self, scale: float, start: float | None = None):
+        self.scale = scale
+        self._wall_start = time.time()
+        self._start = self._wall_start if start is None else start
+
+    def now(self) -> float:
+        return self._start + (time.time() - self._wall_start) * self.scale
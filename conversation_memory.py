@@ -0,0 +1,92 @@
+import os
+import asyncio
+import contextvars
+from collections import deque
+from dotenv import load_dotenv
+
+from llm_services import summarize_conversation
+from prompt_builder import estimate_tokens
+
+load_dotenv()
+
+# Token budget for the verbatim recent turns sent with every persona call
+MEMORY_HISTORY_TOKENS = int(os.getenv("MEMORY_HISTORY_TOKENS", "1500"))
+# Length the rolling summary is asked to stay under
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+
+
+class ConversationMemory:
+    """
+    Bounded persona memory. Recent turns are kept verbatim up to a token budget; once they exceed it,
+    the oldest half is folded into a rolling summary by the reflex model in the background. The summary
+    only changes on a fold, so the system prompt plus summary stays a stable, cacheable prefix.
+    """
+
+    def __init__(self, history_tokens: int = MEMORY_HISTORY_TOKENS, summary_tokens: int = MEMORY_SUMMARY_TOKENS):
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.summary = ""
+        # (event, reply, estimated tokens), oldest first
+        self.turns: deque[tuple[str, str, int]] = deque()
+        self._turn_tokens = 0
+        self._fold_task: asyncio.Task | None = None
+
+    def context(self) -> tuple[str, list[tuple[str, str]]]:
+        """Returns the summary and the newest turns that fit the history budget, oldest first."""
+        history = []
+        used = 0
+        for event, reply, tokens in reversed(self.turns):
+            if used + tokens > self.history_tokens:
+                break
+            history.append((event, reply))
+            used += tokens
+        history.reverse()
+        return self.summary, history
+
+    def add_turn(self, event: str, reply: str):
+        """Records a completed turn and starts a fold if the verbatim turns went over budget."""
+        tokens = estimate_tokens(event) + estimate_tokens(reply)
+        self.turns.append((event, reply, tokens))
+        self._turn_tokens += tokens
+        if self._turn_tokens > self.history_tokens:
+            self._start_fold()
+        # If summarizing keeps failing, turns beyond twice the budget are dropped to keep memory bounded
+        while self._turn_tokens > 2 * self.history_tokens and len(self.turns) > 1:
+            self._turn_tokens -= self.turns.popleft()[2]
+
+    def _start_fold(self):
+        if self._fold_task is not None and not self._fold_task.done():
+            return
+        try:
+            # A fresh context, so the fold neither inherits nor is cut short by the current turn's deadline
+            self._fold_task = asyncio.get_running_loop().create_task(self._fold(), context=contextvars.Context())
+        except RuntimeError:
+            # No event loop (e.g. a synchronous caller); the next turn will try again
+            self._fold_task = None
+
+    async def _fold(self):
+        # Fold the oldest turns until the rest fit in half the budget, so folds happen every few turns rather than every turn
+        folded = []
+        remaining = self._turn_tokens
+        for event, reply, tokens in self.turns:
+            if remaining <= self.history_tokens // 2:
+                break
+            folded.append((event, reply, tokens))
+            remaining -= tokens
+        if not folded:
+            return
+
+        summary = await summarize_conversation(self.summary, [(event, reply) for event, reply, _ in folded], self.summary_tokens)
+        if summary is None:
+            return
+        self.summary = summary
+        # New turns are only ever appended, so the folded ones are still at the front unless they were dropped
+        for turn in folded:
+            if self.turns and self.turns[0] is turn:
+                self._turn_tokens -= self.turns.popleft()[2]
+
+    async def close(self):
+        if self._fold_task is not None:
+            self._fold_task.cancel()
+            await asyncio.gather(self._fold_task, return_exceptions=True)
+            self._fold_task = None
@@ -1,115 +1,362 @@
-import time
 import os
+import json
+import math
 import importlib
-from plugins.base import OrganPlugin
+from typing import Callable
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from plugins.base import OrganPlugin, OrganProperty
+from impact_plan import ImpactCompiler, ImpactError
+from impact_schema import ImpactSchema, impact_schema_for
+from sensations import SensationIndex, SensationChange
+from update_graph import update_levels
+from metrics import metrics
+from clock import WallClock
+
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plugins")
+# Records, per plugin file, its mtime, plugin classes and their properties so later loads skip introspection.
+PLUGIN_MANIFEST_PATH = os.path.join(PLUGIN_DIR, ".manifest.json")
+
+# Manifests already read in this process, keyed by path
+_manifest_cache: dict[str, dict] = {}
+
 
 class BodyEngine:
-    def __init__(self):
+    def __init__(self, lazy: bool = False, max_substep: float = 1.0, verbose: bool = False, manifest_path: str | None = PLUGIN_MANIFEST_PATH, instrument: bool = False, clock=None, parallel: bool = False):
+        # In lazy mode `update` does nothing; state is fast-forwarded in one step whenever it is read.
+        self.lazy = lazy
+        # Longest step used when sub-stepping plugins that have no closed-form `advance`.
+        self.max_substep = max_substep
+        # Print every plugin and property as it is registered
+        self.verbose = verbose
+        self.manifest_path = manifest_path
+        # Record the duration of every plugin update in the shared metrics registry
+        self.instrument = instrument
+        # Source of "now" for update/fast_forward: a WallClock by default, or a VirtualClock/ScaledClock from clock.py
+        self.clock = clock if clock is not None else WallClock()
+        # Run the plugins of each independent update level on a thread pool. Only pays off for plugins
+        # whose updates release the GIL (e.g. NumPy-heavy ones); pure-Python updates run faster serially.
+        self.parallel = parallel
         self.plugins: dict[str, OrganPlugin] = {}
         self.property_map: dict[str, OrganPlugin] = {}
+        # Bumped whenever a plugin or property is registered; invalidates the cached schema below.
+        self.schema_version = 0
+        self._schema_cache: tuple[int, str, dict[str, list[str]]] | None = None
+        # (plugin, descriptor) per property, indexed by the handles in compiled impact plans
+        self._property_handles: list[tuple[OrganPlugin, OrganProperty]] = []
+        self._impact_compiler: tuple[int, ImpactCompiler] | None = None
+        self._impact_schema: tuple[int, ImpactSchema] | None = None
+        self._sensation_index: tuple[int, SensationIndex] | None = None
+        self._sensation_listeners: list[Callable[[SensationChange], None]] = []
+        # Plugin names grouped into dependency levels, in update order (see update_graph.update_levels)
+        self.update_levels: list[list[str]] = []
+        self._tick_pipeline: tuple[int, list[list[Callable[[float], None]]], list[Callable[[float], None]]] | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        # Optional persistence.ImpactLog recording every tick and applied impact
+        self.journal = None
         self.load_plugins()
-        self.last_update_time = time.time()
+        # Order the plugins now, so a dependency cycle is reported at load time rather than on the first tick
+        self._get_tick_pipeline()
+        self.last_update_time = self.clock.now()
 
     def load_plugins(self):
         """Dynamically loads all plugins from the 'plugins' directory."""
-        plugin_dir = "plugins"
-        for filename in os.listdir(plugin_dir):
+        manifest = self._read_manifest()
+        updated_manifest = {}
+        # Sorted, so plugin order (and with it the update order's tie-breaks) is the same on every platform
+        for filename in sorted(os.listdir(PLUGIN_DIR)):
             if filename.endswith(".py") and filename != "base.py":
-                module_name = f"{plugin_dir}.{filename[:-3]}"
+                module_name = f"plugins.{filename[:-3]}"
                 try:
+                    mtime = os.stat(os.path.join(PLUGIN_DIR, filename)).st_mtime_ns
                     module = importlib.import_module(module_name)
-                    for item_name in dir(module):
-                        item = getattr(module, item_name)
-                        if isinstance(item, type) and issubclass(item, OrganPlugin) and item is not OrganPlugin:
-                            plugin_instance = item(self)
-                            self.plugins[plugin_instance.name] = plugin_instance
-                            plugin_instance.register_properties()
+                    entry = manifest.get(filename)
+                    if entry is None or entry["mtime"] != mtime or entry["module"] != module_name:
+                        entry = {"module": module_name, "mtime": mtime, "classes": self._scan_module(module)}
+                    updated_manifest[filename] = entry
+
+                    for class_entry in entry["classes"]:
+                        plugin_instance = getattr(module, class_entry["class"])(self)
+                        self.plugins[plugin_instance.name] = plugin_instance
+                        self.schema_version += 1
+                        plugin_instance.register_properties(class_entry["properties"])
+                        if self.verbose:
                             print(f"[Engine] Loaded plugin: {plugin_instance.name}")
                 except Exception as e:
                     print(f"[Engine ERROR] Failed to load plugin {module_name}: {e}")
 
+        if updated_manifest != manifest:
+            self._write_manifest(updated_manifest)
+
+    @staticmethod
+    def _scan_module(module) -> list[dict]:
+        """Finds the plugin classes in a module and the OrganProperty names each one declares."""
+        classes = []
+        for item_name in dir(module):
+            item = getattr(module, item_name)
+            if isinstance(item, type) and issubclass(item, OrganPlugin) and item is not OrganPlugin:
+                properties = [
+                    attr_name for attr_name in dir(item)
+                    if isinstance(getattr(item, attr_name), OrganProperty)
+                ]
+                classes.append({"class": item_name, "properties": properties})
+        return classes
+
+    def _read_manifest(self) -> dict:
+        if not self.manifest_path:
+            return {}
+        if self.manifest_path not in _manifest_cache:
+            try:
+                with open(self.manifest_path, encoding="utf-8") as f:
+                    _manifest_cache[self.manifest_path] = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                _manifest_cache[self.manifest_path] = {}
+        return _manifest_cache[self.manifest_path]
+
+    def _write_manifest(self, manifest: dict):
+        if not self.manifest_path:
+            return
+        if _manifest_cache.get(self.manifest_path) == manifest:
+            return
+        _manifest_cache[self.manifest_path] = manifest
+        # Write then rename, so an engine loading concurrently (e.g. another session worker) never reads
+        # a half-written manifest; the pid keeps concurrent writers off each other's temporary file
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            print(f"[Engine WARNING] Could not write plugin manifest '{self.manifest_path}': {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
     def register_property(self, prop_name: str, plugin: OrganPlugin):
         """Registers a property with the engine, mapping it to a plugin."""
         if prop_name in self.property_map:
             print(f"[Engine WARNING] Property '{prop_name}' is already registered. Overwriting.")
         self.property_map[prop_name] = plugin
-        print(f"[Engine] Registered property '{prop_name}' to plugin '{plugin.name}'")
+        self.schema_version += 1
+        if self.verbose:
+            print(f"[Engine] Registered property '{prop_name}' to plugin '{plugin.name}'")
+
+    def close(self):
+        """Shuts down the plugin-update threads of a parallel engine; later ticks run sequentially."""
+        self.parallel = False
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
 
     def get_plugin(self, name: str) -> OrganPlugin | None:
         """Gets a loaded plugin by its name."""
         return self.plugins.get(name)
 
     def update(self):
-        current_time = time.time()
+        if self.lazy:
+            return
+
+        current_time = self.clock.now()
         tick_duration = current_time - self.last_update_time
         self.last_update_time = current_time
 
         if tick_duration > 0:
-            for plugin in self.plugins.values():
-                plugin.update(tick_duration)
+            self.step(tick_duration)
 
-    def get_all_sensations(self) -> list[str]:
-        all_sensations = []
+    def fast_forward(self):
+        """Brings a lazy engine up to the current time in a single step."""
+        current_time = self.clock.now()
+        elapsed = current_time - self.last_update_time
+        self.last_update_time = current_time
+
+        if elapsed > 0:
+            self.step(elapsed)
+
+    @property
+    def update_order(self) -> list[str]:
+        """Plugin names in the order their updates run."""
+        return [name for level in self.update_levels for name in level]
+
+    def step(self, tick_duration: float):
+        """
+        Advances every plugin by `tick_duration` seconds, independent of the wall clock, in dependency
+        order. Lazy engines use each plugin's closed-form `advance` (or sub-steps); others run a single `update`.
+        """
+        _, levels, steps = self._get_tick_pipeline()
+        if self._executor is None:
+            for plugin_step in steps:
+                plugin_step(tick_duration)
+        else:
+            for level in levels:
+                if len(level) == 1:
+                    level[0](tick_duration)
+                    continue
+                for future in [self._executor.submit(plugin_step, tick_duration) for plugin_step in level]:
+                    future.result()
+        self._refresh_sensations()
+        if self.journal is not None:
+            self.journal.log_tick(self.last_update_time, tick_duration)
+
+    def _get_tick_pipeline(self):
+        """
+        Orders the plugins by their declared reads and writes and binds one step function per plugin,
+        so a tick is a flat loop over pre-bound calls. Rebuilt only after a new registration.
+        """
+        if self._tick_pipeline is not None and self._tick_pipeline[0] == self.schema_version:
+            return self._tick_pipeline
+        self.update_levels = update_levels(self.plugins, self.property_map)
         for plugin in self.plugins.values():
-            all_sensations.extend(plugin.get_sensations())
-        return all_sensations
+            plugin.bind()
+        levels = [[self._plugin_step(self.plugins[name]) for name in level] for level in self.update_levels]
+        self._tick_pipeline = (self.schema_version, levels, [plugin_step for level in levels for plugin_step in level])
+        if self.parallel and self._executor is None and any(len(level) > 1 for level in levels):
+            self._executor = ThreadPoolExecutor(max(len(level) for level in levels), thread_name_prefix="plugin-update")
+        return self._tick_pipeline
+
+    def _plugin_step(self, plugin: OrganPlugin) -> Callable[[float], None]:
+        """The function that advances one plugin by a tick, chosen once for this engine's mode."""
+        if self.lazy:
+            if type(plugin).advance is not OrganPlugin.advance:
+                return plugin.advance
+            return partial(self._advance_plugin, plugin)
+        if not self.instrument:
+            return plugin.update
+        update = plugin.update
+        span_name = f"plugin_update_{plugin.name}"
+
+        def instrumented_update(tick_duration: float):
+            with metrics.span(span_name):
+                update(tick_duration)
+        return instrumented_update
+
+    def _advance_plugin(self, plugin: OrganPlugin, elapsed: float):
+        """Uses the plugin's closed-form `advance` when it has one, otherwise sub-steps `update`."""
+        if type(plugin).advance is not OrganPlugin.advance:
+            plugin.advance(elapsed)
+            return
+        steps = max(1, math.ceil(elapsed / self.max_substep))
+        step = elapsed / steps
+        for _ in range(steps):
+            plugin.update(step)
+
+    def get_all_sensations(self) -> list[str]:
+        """Returns the active sensations, as a new list."""
+        if self.lazy:
+            self.fast_forward()
+        # Cheap when nothing crossed a threshold; catches values set outside update/apply_impact
+        self._refresh_sensations()
+        return list(self._sensation_index[1].sensations)
+
+    def subscribe_sensations(self, listener: Callable[[SensationChange], None]):
+        """Calls `listener` with a SensationChange whenever the set of active sensations changes."""
+        self._sensation_listeners.append(listener)
+
+    def unsubscribe_sensations(self, listener: Callable[[SensationChange], None]):
+        if listener in self._sensation_listeners:
+            self._sensation_listeners.remove(listener)
+
+    def _refresh_sensations(self):
+        if self._sensation_index is None or self._sensation_index[0] != self.schema_version:
+            self._sensation_index = (self.schema_version, SensationIndex(self.plugins))
+        change = self._sensation_index[1].refresh()
+        if change is not None:
+            for listener in list(self._sensation_listeners):
+                listener(change)
 
     def get_full_state(self) -> dict[str, dict]:
+        if self.lazy:
+            self.fast_forward()
         full_state = {}
         for name, plugin in self.plugins.items():
             full_state[name.capitalize()] = plugin.get_state()
         return full_state
 
+    def get_raw_state(self) -> dict[str, dict[str, float]]:
+        """Returns the raw numeric value of every registered property, grouped by plugin name."""
+        if self.lazy:
+            self.fast_forward()
+        _, _, properties_by_plugin = self._get_schema_cache()
+        return {
+            name: {prop_name: round(getattr(self.plugins[name], prop_name), 2) for prop_name in prop_names}
+            for name, prop_names in properties_by_plugin.items()
+        }
+
     def get_organs_schema(self) -> str:
         """Generates a schema of all organs and their attributes for the LLM."""
+        return self._get_schema_cache()[1]
+
+    def get_impact_schema(self) -> ImpactSchema:
+        """The strict JSON Schema (and local validator) for reflex impacts on the loaded plugins."""
+        if self._impact_schema is None or self._impact_schema[0] != self.schema_version:
+            _, _, properties_by_plugin = self._get_schema_cache()
+            schema = impact_schema_for({
+                name: (type(self.plugins[name]), prop_names) for name, prop_names in properties_by_plugin.items()
+            })
+            self._impact_schema = (self.schema_version, schema)
+        return self._impact_schema[1]
+
+    def _get_schema_cache(self) -> tuple[int, str, dict[str, list[str]]]:
+        """Rebuilds the organ schema and the per-plugin property lists only after a new registration."""
+        if self._schema_cache is not None and self._schema_cache[0] == self.schema_version:
+            return self._schema_cache
+
+        properties_by_plugin: dict[str, list[str]] = {name: [] for name in self.plugins}
+        for prop_name, owner_plugin in self.property_map.items():
+            if owner_plugin.name in properties_by_plugin:
+                properties_by_plugin[owner_plugin.name].append(prop_name)
+
         schema = "# Organ Schema\n"
         schema += "You must use the following schema to format your JSON response. Do not add attributes not listed here.\n\n"
         
         for name, plugin in self.plugins.items():
             schema += f"## Plugin: {name}\n"
             # Use the registered properties for a more accurate schema
-            for prop_name, owner_plugin in self.property_map.items():
-                if owner_plugin == plugin:
-                    prop_instance = getattr(plugin, prop_name)
-                    prop_type = type(prop_instance).__name__
-                    schema += f"- {prop_name}: {prop_type}\n"
+            for prop_name in properties_by_plugin[name]:
+                prop_instance = getattr(plugin, prop_name)
+                prop_type = type(prop_instance).__name__
+                schema += f"- {prop_name}: {prop_type}\n"
             schema += "\n"
-            
-        return schema
+
+        self._schema_cache = (self.schema_version, schema, properties_by_plugin)
+        return self._schema_cache
 
     def apply_impact(self, impact: dict):
-        """Applies a dictionary of impacts to the relevant organ properties with strict error handling."""
+        """
+        Applies a dictionary of impacts to the relevant organ properties. The impact is compiled (and fully
+        validated) first, so an invalid entry raises ImpactError without changing any property.
+        """
         # The impact format is expected to be: {"plugin_name": {"prop_name": "+=value"}}
-        for plugin_name, properties in impact.items():
-            if not isinstance(properties, dict):
-                print(f"[Engine ERROR] Invalid impact format for '{plugin_name}'. Expected a dictionary of properties.")
-                continue
+        try:
+            plan = self._get_impact_compiler().compile(impact)
+        except ImpactError as e:
+            print(f"[Engine CRITICAL] {e}")
+            raise
+        if self.lazy:
+            self.fast_forward()
+        handles = self._property_handles
+        # Read every target before writing any, so the plan lands as a whole
+        updates = [
+            (handles[handle], handles[handle][1].__get__(handles[handle][0], None) + delta)
+            for handle, delta in zip(plan.handles, plan.deltas)
+        ]
+        for (plugin, descriptor), value in updates:
+            descriptor.__set__(plugin, value)
+        self._refresh_sensations()
+        if self.journal is not None:
+            self.journal.log_impact(self.clock.now(), impact)
+        if self.verbose:
+            print(f"[Engine] Applied impact: {plan.describe()}")
 
-            for prop_name, value_str in properties.items():
-                try:
-                    # Clean the value string to extract the number. Handles formats like '+=5.0', '-=2', '5'.
-                    cleaned_value_str = "".join(filter(lambda c: c in '-.0123456789', value_str))
-                    if not cleaned_value_str:
-                        raise ValueError("No numeric value found in string")
-                    
-                    change = float(cleaned_value_str)
-                    lower_prop_name = prop_name.lower()
-
-                    if lower_prop_name not in self.property_map:
-                        raise ValueError(f"No plugin registered for property: '{lower_prop_name}'")
-
-                    plugin = self.property_map[lower_prop_name]
-                    
-                    # Strict check: does the plugin in the impact match the registered owner?
-                    if plugin.name.lower() != plugin_name.lower():
-                        raise ValueError(f"Mismatched plugin for property '{lower_prop_name}'. Impact specified '{plugin_name}' but property is owned by '{plugin.name}'.")
-
-                    current_value = getattr(plugin, lower_prop_name)
-                    setattr(plugin, lower_prop_name, current_value + change)
-                    print(f"[Engine] Applied impact: {plugin.name}.{lower_prop_name} changed by {change}")
-
-                except (ValueError, TypeError) as e:
-                    # Re-raise the exception to halt execution and provide a full traceback.
-                    # This is a deliberate choice for strict, fail-fast debugging.
-                    print(f"[Engine CRITICAL] Halting due to error while applying impact for '{plugin_name}.{prop_name}' with value '{value_str}'. Reason: {e}")
-                    raise
+    def _get_impact_compiler(self) -> ImpactCompiler:
+        """Rebuilds the property handle table and impact compiler only after a new registration."""
+        if self._impact_compiler is not None and self._impact_compiler[0] == self.schema_version:
+            return self._impact_compiler[1]
+        self._property_handles = [
+            (plugin, getattr(type(plugin), prop_name)) for prop_name, plugin in self.property_map.items()
+        ]
+        compiler = ImpactCompiler({
+            prop_name: (handle, plugin.name) for handle, (prop_name, plugin) in enumerate(self.property_map.items())
+        })
+        self._impact_compiler = (self.schema_version, compiler)
+        return compiler
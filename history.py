@@ -0,0 +1,177 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Buckets kept at each rollup resolution. The defaults cover 10 minutes at 1s, 12 hours at 1m and a week at 1h.
+HISTORY_1S_CAPACITY = int(os.getenv("HISTORY_1S_CAPACITY", "600"))
+HISTORY_1M_CAPACITY = int(os.getenv("HISTORY_1M_CAPACITY", "720"))
+HISTORY_1H_CAPACITY = int(os.getenv("HISTORY_1H_CAPACITY", "168"))
+
+# Resolution in seconds -> level name
+LEVEL_NAMES = {1: "1s", 60: "1m", 3600: "1h"}
+
+# Rows of a rollup sample
+MEAN, MIN, MAX = 0, 1, 2
+
+
+class RingBuffer:
+    """A preallocated circular buffer of timestamped numeric samples; once full, the oldest sample is overwritten."""
+
+    def __init__(self, capacity: int, shape: tuple[int, ...], dtype=np.float32):
+        self.capacity = max(1, capacity)
+        self.times = np.zeros(self.capacity)
+        self.values = np.zeros((self.capacity, *shape), dtype=dtype)
+        self.size = 0
+        self._next = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, timestamp: float, sample):
+        self.times[self._next] = timestamp
+        self.values[self._next] = sample
+        self._next = (self._next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def ordered(self) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (times, values), oldest first."""
+        if self.size < self.capacity:
+            return self.times[:self.size], self.values[:self.size]
+        order = np.r_[self._next:self.capacity, 0:self._next]
+        return self.times[order], self.values[order]
+
+
+class Rollup:
+    """Aggregates samples into fixed-width time buckets, keeping the mean, min and max of each bucket."""
+
+    def __init__(self, resolution: float, capacity: int, width: int):
+        self.resolution = resolution
+        self.buffer = RingBuffer(capacity, (3, width))
+        self._bucket: int | None = None
+        self._sum = np.zeros(width)
+        self._min = np.zeros(width)
+        self._max = np.zeros(width)
+        self._count = 0
+
+    def add(self, timestamp: float, row: np.ndarray):
+        bucket = int(timestamp // self.resolution)
+        if bucket != self._bucket:
+            self._close_bucket()
+            self._bucket = bucket
+            self._sum[:] = row
+            self._min[:] = row
+            self._max[:] = row
+            self._count = 1
+            return
+        self._sum += row
+        np.minimum(self._min, row, out=self._min)
+        np.maximum(self._max, row, out=self._max)
+        self._count += 1
+
+    def _close_bucket(self):
+        if self._count:
+            self.buffer.append(self._bucket * self.resolution, (self._sum / self._count, self._min, self._max))
+
+    def ordered(self) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (times, values[bucket, MEAN/MIN/MAX, property]) including the still-open bucket."""
+        times, values = self.buffer.ordered()
+        if not self._count:
+            return times, values
+        current = np.stack((self._sum / self._count, self._min, self._max)).astype(values.dtype)[None]
+        return np.append(times, self._bucket * self.resolution), np.concatenate((values, current))
+
+
+class BodyHistory:
+    """
+    Records every registered OrganProperty of a BodyEngine into 1s/1m/1h rollups. All buffers are
+    allocated up front, so memory stays constant however long the session runs.
+    """
+
+    def __init__(self, engine, capacities: dict[float, int] | None = None):
+        self.engine = engine
+        if capacities is None:
+            capacities = {1: HISTORY_1S_CAPACITY, 60: HISTORY_1M_CAPACITY, 3600: HISTORY_1H_CAPACITY}
+        # Properties grouped by plugin, in plugin order
+        self.property_names: list[str] = []
+        self._sources: list[tuple[object, str]] = []
+        for plugin in engine.plugins.values():
+            for prop_name, owner_plugin in engine.property_map.items():
+                if owner_plugin is plugin:
+                    self.property_names.append(prop_name)
+                    self._sources.append((plugin, getattr(type(plugin), prop_name)._private_name))
+        self._columns = {name: i for i, name in enumerate(self.property_names)}
+        self.levels = {
+            LEVEL_NAMES.get(resolution, f"{resolution}s"): Rollup(resolution, capacity, len(self.property_names))
+            for resolution, capacity in capacities.items()
+        }
+        # Bumped on every recorded sample, so renderers can skip unchanged history
+        self.version = 0
+
+    def record(self, timestamp: float | None = None):
+        """Samples the engine's current property values into every rollup level."""
+        if timestamp is None:
+            timestamp = self.engine.clock.now()
+        if self.engine.lazy:
+            self.engine.fast_forward()
+        row = np.fromiter((getattr(plugin, private_name) for plugin, private_name in self._sources), float, len(self._sources))
+        for rollup in self.levels.values():
+            rollup.add(timestamp, row)
+        self.version += 1
+
+    def series(self, prop_name: str, level: str = "1s", points: int | None = None, method: str = "lttb") -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (times, values) of one property's bucket means at `level`, downsampled to about
+        `points` samples with LTTB or min/max when given.
+        """
+        times, values = self.levels[level].ordered()
+        values = values[:, MEAN, self._columns[prop_name]]
+        if points is None or len(values) <= points:
+            return times, values
+        if method == "minmax":
+            return downsample_minmax(times, values, max(1, points // 2))
+        return downsample_lttb(times, values, points)
+
+    def nbytes(self) -> int:
+        """Memory held by the history buffers."""
+        return sum(rollup.buffer.times.nbytes + rollup.buffer.values.nbytes for rollup in self.levels.values())
+
+
+def downsample_minmax(times: np.ndarray, values: np.ndarray, buckets: int) -> tuple[np.ndarray, np.ndarray]:
+    """Splits the series into `buckets` equal chunks and keeps each chunk's min and max, in time order."""
+    if len(values) <= 2 * buckets:
+        return times, values
+    edges = np.linspace(0, len(values), buckets + 1).astype(int)
+    indices = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        chunk = values[start:end]
+        low, high = start + int(np.argmin(chunk)), start + int(np.argmax(chunk))
+        indices.extend(sorted({low, high}))
+    return times[indices], values[indices]
+
+
+def downsample_lttb(times: np.ndarray, values: np.ndarray, threshold: int) -> tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets downsampling to `threshold` points, keeping the first and last point."""
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return times, values
+    x = times.astype(float)
+    y = values.astype(float)
+    bucket_size = (n - 2) / (threshold - 2)
+    indices = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # The next bucket's average is the third corner of the triangle
+        avg_start = int((i + 1) * bucket_size) + 1
+        avg_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = x[avg_start:avg_end].mean()
+        avg_y = y[avg_start:avg_end].mean()
+
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        indices.append(a)
+    indices.append(n - 1)
+    return times[indices], values[indices]
@@ -0,0 +1,124 @@
+import re
+import math
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# "+=VALUE" / "-=VALUE", or a bare signed number. VALUE may use exponent notation ("+=1e3").
+_DELTA_PATTERN = re.compile(r"^\s*(?:([+-])=)?\s*([+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)\s*$")
+
+# Compiled plans kept per compiler, keyed by the impact's contents
+IMPACT_PLAN_CACHE_SIZE = 256
+
+
+class ImpactError(ValueError):
+    """Raised when an impact cannot be compiled. Nothing has been applied when this is raised."""
+
+
+def parse_delta(value) -> float:
+    """Parses an impact value ("+=5.0", "-=2", "1e3", or a JSON number) into a float delta."""
+    if isinstance(value, bool):
+        raise ImpactError(f"Expected a numeric change, got {value!r}")
+    if isinstance(value, (int, float)):
+        delta = float(value)
+    elif isinstance(value, str):
+        match = _DELTA_PATTERN.match(value)
+        if match is None:
+            raise ImpactError(f"Invalid change {value!r}; expected '+=VALUE', '-=VALUE' or a number")
+        operator, number = match.groups()
+        delta = -float(number) if operator == "-" else float(number)
+    else:
+        raise ImpactError(f"Expected a numeric change, got {type(value).__name__}")
+    if not math.isfinite(delta):
+        raise ImpactError(f"Change {value!r} is not a finite number")
+    return delta
+
+
+@dataclass(frozen=True)
+class ImpactPlan:
+    """A validated impact: property handles (indices into the compiler's table) and the delta for each."""
+    handles: tuple[int, ...]
+    deltas: tuple[float, ...]
+    # Qualified "plugin.property" names, for logging
+    labels: tuple[str, ...]
+
+    def describe(self) -> str:
+        return ", ".join(f"{label} {delta:+g}" for label, delta in zip(self.labels, self.deltas))
+
+
+class ImpactCompiler:
+    """
+    Turns LLM impact dicts ({"plugin": {"property": "+=VALUE"}}) into ImpactPlans. The whole impact is
+    validated before a plan is returned, and plans for impacts seen before are served from a small LRU.
+    """
+
+    def __init__(self, properties: dict[str, tuple[int, str]], cache_size: int = IMPACT_PLAN_CACHE_SIZE):
+        # property name -> (handle, owning plugin name)
+        self.properties = properties
+        self.cache_size = cache_size
+        self._plans: OrderedDict[tuple, ImpactPlan] = OrderedDict()
+
+    def compile(self, impact: dict) -> ImpactPlan:
+        key = self._cache_key(impact)
+        if key is not None:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+
+        plan = self._compile(impact)
+        if key is not None:
+            self._plans[key] = plan
+            if len(self._plans) > self.cache_size:
+                self._plans.popitem(last=False)
+        return plan
+
+    @staticmethod
+    def _cache_key(impact: dict) -> tuple | None:
+        try:
+            # Flat for speed; each plugin's property count keeps the layout unambiguous. The value's type is
+            # part of the key because True == 1 and hashes alike, but only 1 is a valid change.
+            key = []
+            for plugin_name, properties in impact.items():
+                key += (plugin_name, len(properties))
+                for prop_name, value in properties.items():
+                    key += (prop_name, value.__class__, value)
+            key = tuple(key)
+            hash(key)
+            return key
+        except (AttributeError, TypeError):
+            # Malformed or unhashable impacts are compiled (and rejected) without caching
+            return None
+
+    def _compile(self, impact: dict) -> ImpactPlan:
+        if not isinstance(impact, dict):
+            raise ImpactError(f"Expected an impact object, got {type(impact).__name__}")
+
+        deltas: dict[int, float] = {}
+        labels: dict[int, str] = {}
+        errors = []
+        for plugin_name, properties in impact.items():
+            if not isinstance(properties, dict):
+                errors.append(f"'{plugin_name}': expected a dictionary of properties")
+                continue
+            for prop_name, value in properties.items():
+                lower_prop_name = str(prop_name).lower()
+                entry = self.properties.get(lower_prop_name)
+                if entry is None:
+                    errors.append(f"'{plugin_name}.{prop_name}': no plugin registered for property '{lower_prop_name}'")
+                    continue
+                handle, owner = entry
+                # Strict check: does the plugin in the impact match the registered owner?
+                if owner.lower() != str(plugin_name).lower():
+                    errors.append(f"'{plugin_name}.{prop_name}': property is owned by '{owner}'")
+                    continue
+                try:
+                    delta = parse_delta(value)
+                except ImpactError as e:
+                    errors.append(f"'{plugin_name}.{prop_name}': {e}")
+                    continue
+                deltas[handle] = deltas.get(handle, 0.0) + delta
+                labels[handle] = f"{owner}.{lower_prop_name}"
+
+        if errors:
+            raise ImpactError("Rejected impact: " + "; ".join(errors))
+        return ImpactPlan(tuple(deltas), tuple(deltas.values()), tuple(labels.values()))
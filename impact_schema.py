@@ -0,0 +1,97 @@
+from plugins.base import OrganProperty
+from impact_plan import ImpactError, parse_delta
+
+IMPACT_SCHEMA_NAME = "body_impact"
+
+# Schemas already built in this process, keyed by plugin set
+_schema_cache: dict[tuple, "ImpactSchema"] = {}
+
+
+def _describe(descriptor: OrganProperty) -> str:
+    """The property's description plus its value type and range, for the model."""
+    value_type = "integer" if isinstance(descriptor.default, int) else "number"
+    low = "-inf" if descriptor.min_val is None else f"{descriptor.min_val:g}"
+    high = "inf" if descriptor.max_val is None else f"{descriptor.max_val:g}"
+    description = descriptor.description.strip()
+    return (
+        f"{description + ' ' if description else ''}The value is a {value_type} kept within [{low}, {high}]. "
+        "Give the change caused by the event: positive to increase, negative to decrease, 0 if unaffected."
+    )
+
+
+class ImpactSchema:
+    """
+    A strict JSON Schema for reflex impacts ({"plugin": {"property": delta}} with numeric deltas),
+    built from OrganProperty metadata, and a local validator for backends that cannot enforce it.
+    """
+
+    def __init__(self, properties: dict[str, dict[str, OrganProperty]]):
+        # plugin name -> property name -> descriptor
+        self.properties = properties
+        # Strict mode requires every key to be listed and required; unaffected properties come back as 0
+        self.json_schema = {
+            "type": "object",
+            "properties": {
+                plugin_name: {
+                    "type": "object",
+                    "properties": {
+                        prop_name: {"type": "number", "description": _describe(descriptor)}
+                        for prop_name, descriptor in descriptors.items()
+                    },
+                    "required": list(descriptors),
+                    "additionalProperties": False,
+                }
+                for plugin_name, descriptors in properties.items()
+            },
+            "required": list(properties),
+            "additionalProperties": False,
+        }
+        self.response_format = {
+            "type": "json_schema",
+            "json_schema": {"name": IMPACT_SCHEMA_NAME, "strict": True, "schema": self.json_schema},
+        }
+
+    def validate(self, impact) -> tuple[dict[str, dict[str, float]], list[str]]:
+        """
+        Keeps the well-formed, non-zero changes of `impact` as float deltas ("+=VALUE" strings are
+        accepted too) and describes every entry it dropped, so one bad entry does not waste the turn.
+        """
+        if not isinstance(impact, dict):
+            return {}, [f"expected an object, got {type(impact).__name__}"]
+        valid: dict[str, dict[str, float]] = {}
+        problems = []
+        for plugin_name, changes in impact.items():
+            descriptors = self.properties.get(plugin_name)
+            if descriptors is None:
+                problems.append(f"unknown plugin '{plugin_name}'")
+                continue
+            if not isinstance(changes, dict):
+                problems.append(f"'{plugin_name}': expected an object of changes")
+                continue
+            for prop_name, value in changes.items():
+                if prop_name not in descriptors:
+                    problems.append(f"'{plugin_name}.{prop_name}': unknown property")
+                    continue
+                try:
+                    delta = parse_delta(value)
+                except ImpactError as e:
+                    problems.append(f"'{plugin_name}.{prop_name}': {e}")
+                    continue
+                if delta:
+                    valid.setdefault(plugin_name, {})[prop_name] = delta
+        return valid, problems
+
+
+def impact_schema_for(plugin_properties: dict[str, tuple[type, list[str]]]) -> ImpactSchema:
+    """
+    Returns the ImpactSchema for plugins given as {plugin name: (plugin class, property names)}.
+    Engines loading the same plugins share one instance.
+    """
+    key = tuple((name, cls, tuple(prop_names)) for name, (cls, prop_names) in plugin_properties.items())
+    schema = _schema_cache.get(key)
+    if schema is None:
+        schema = _schema_cache[key] = ImpactSchema({
+            name: {prop_name: getattr(cls, prop_name) for prop_name in prop_names}
+            for name, (cls, prop_names) in plugin_properties.items()
+        })
+    return schema
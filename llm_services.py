@@ -1,7 +1,15 @@
 import os
+import time
+import asyncio
 import httpx
 import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from dotenv import load_dotenv
+from prompt_builder import build_reflex_messages, build_batch_reflex_messages, build_persona_messages, build_summary_messages
+from impact_schema import ImpactSchema
+from metrics import metrics
+from resilience import ResilientCaller, DeadlineExceeded, is_retryable, slot_acquired
 
 # Load environment variables from .env file
 load_dotenv()
@@ -12,120 +20,376 @@ API_BASE_URL = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
 # Get model names from environment variables, with sensible defaults
 REFLEX_MODEL = os.getenv("REFLEX_MODEL_NAME", "gpt-5")
 PERSONA_MODEL = os.getenv("PERSONA_MODEL_NAME", "gpt-5")
+# Optional faster models tried once the primary model's retries are used up
+REFLEX_FALLBACK_MODEL = os.getenv("REFLEX_FALLBACK_MODEL_NAME")
+PERSONA_FALLBACK_MODEL = os.getenv("PERSONA_FALLBACK_MODEL_NAME")
 
-async def get_reflex_impact(event_description: str, current_body_state: dict, organs_schema: str | None = None) -> dict | None:
+# Connection pool settings for the shared HTTP client
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+# Maximum number of in-flight requests per model
+MODEL_CONCURRENCY = int(os.getenv("MODEL_CONCURRENCY", "4"))
+# Stream persona responses token by token instead of waiting for the full completion
+PERSONA_STREAMING = os.getenv("PERSONA_STREAMING", "true").lower() in ("1", "true", "yes")
+# Ask streamed persona responses for a final usage chunk (`stream_options`); disable for backends that reject the field
+PERSONA_STREAM_USAGE = os.getenv("PERSONA_STREAM_USAGE", "true").lower() in ("1", "true", "yes")
+# Send reflex calls the impact JSON Schema (`response_format: json_schema`) instead of plain JSON mode.
+# Models whose backend rejects it are switched to JSON mode with the prose schema automatically.
+REFLEX_STRUCTURED_OUTPUT = os.getenv("REFLEX_STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+
+
+class LLMClientManager:
+    """Owns a long-lived, pooled HTTP client shared by every LLM call, plus a concurrency limit per model."""
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections: int = HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        http2: bool = HTTP2_ENABLED,
+        model_concurrency: int = MODEL_CONCURRENCY,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self.model_concurrency = model_concurrency
+        self._client: httpx.AsyncClient | None = None
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    async def open(self):
+        """Creates the pooled client. Safe to call more than once."""
+        if self._client is not None:
+            return
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("[LLM WARNING] HTTP2_ENABLED is set but the 'h2' package is not installed. Falling back to HTTP/1.1.")
+                http2 = False
+        self._client = httpx.AsyncClient(
+            base_url=API_BASE_URL,
+            headers={
+                "Authorization": f"Bearer {API_KEY}",
+                "Content-Type": "application/json"
+            },
+            limits=self.limits,
+            http2=http2,
+        )
+
+    async def close(self):
+        """Closes the pooled client and drops its connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def semaphore(self, model: str) -> asyncio.Semaphore:
+        """Returns the semaphore limiting concurrent requests to `model`."""
+        if model not in self._semaphores:
+            self._semaphores[model] = asyncio.Semaphore(self.model_concurrency)
+        return self._semaphores[model]
+
+    def has_free_slot(self, model: str) -> bool:
+        """Whether a request to `model` would start right away rather than queue."""
+        return not self.semaphore(model).locked()
+
+    async def post_chat_completion(self, payload: dict, timeout: float) -> httpx.Response:
+        """POSTs a chat completion payload, waiting for a free slot for its model."""
+        # Callers outside the app lifecycle (scripts, tests) get a client on first use.
+        await self.open()
+        async with self.semaphore(payload["model"]):
+            slot_acquired()
+            return await self._client.post("/chat/completions", json=payload, timeout=timeout)
+
+    @asynccontextmanager
+    async def stream_chat_completion(self, payload: dict, timeout: float):
+        """Opens a streaming chat completion. The model's slot is held until the stream is closed."""
+        await self.open()
+        async with self.semaphore(payload["model"]):
+            slot_acquired()
+            async with self._client.stream("POST", "/chat/completions", json=payload, timeout=timeout) as response:
+                yield response
+
+
+client_manager = LLMClientManager()
+reflex_caller = ResilientCaller("reflex", has_capacity=client_manager.has_free_slot)
+persona_caller = ResilientCaller("persona", has_capacity=client_manager.has_free_slot)
+# Background summaries keep their own latency history and retry budget, apart from the reflexes
+summary_caller = ResilientCaller("summary", has_capacity=client_manager.has_free_slot)
+
+
+def _models(primary: str, fallback: str | None) -> list[str]:
+    return [primary, fallback] if fallback and fallback != primary else [primary]
+
+
+# Models whose backend answered a json_schema request with 400 but accepted JSON mode
+_json_schema_unsupported: set[str] = set()
+
+
+def _rejects_json_schema(response: httpx.Response) -> bool:
+    """Whether a response is a 400 complaining about the response format, rather than e.g. the context length."""
+    if response.status_code != 400:
+        return False
+    body = response.text.lower()
+    return "response_format" in body or "json_schema" in body
+
+
+def _validated_impact(impact, impact_schema: ImpactSchema | None):
+    """Drops the entries of a reflex answer that do not match the impact schema, logging what was dropped."""
+    if impact_schema is None:
+        return impact
+    impact, problems = impact_schema.validate(impact)
+    if problems:
+        metrics.increment("reflex_invalid_changes", len(problems))
+        print(f"[LLM WARNING] Dropped invalid reflex changes: {'; '.join(problems)}")
+    return impact
+
+async def get_reflex_impact(
+    event_description: str,
+    current_body_state: dict,
+    organs_schema: str | None = None,
+    impact_schema: ImpactSchema | None = None,
+) -> dict | None:
     """
-    Calls a compatible API to get the physiological impact of an event.
+    Calls a compatible API to get the physiological impact of an event. With an `impact_schema`, the
+    answer is constrained to it (or checked against it locally) and its deltas are numbers.
     Returns a dictionary with the changes, or None if an error occurs.
     """
     if not API_KEY:
         print("ERROR: OPENAI_API_KEY not found in environment variables.")
         return None
 
-    schema_prompt_part = ""
-    if organs_schema:
-        schema_prompt_part = f"""
-[ALLOWED ATTRIBUTES SCHEMA]:
-You MUST strictly adhere to the following schema. Only use the plugin names and attributes provided below.
-{organs_schema}"""
-
-    system_prompt = f"""你是一个生理反射模拟器。根据当前身体状态和发生的事件，计算此事件对身体造成的【直接、瞬时】的冲击。
-
-{schema_prompt_part}
-【OUTPUT FORMAT REQUIREMENTS】:
-1. MUST only output a JSON object.
-2. All top-level keys in the JSON MUST be plugin names as defined in the schema (e.g., "digestive", "circulatory").
-3. Each plugin object can only contain attributes listed for it in the schema.
-4. Attribute values MUST be strings representing the change, in the format "+=VALUE" or "-=VALUE". VALUE must be a number (integer or float).
-
-【OUTPUT EXAMPLE】:
-{{
-  "plugin_name_1": {{
-    "attribute_name_1": "+=10.0",
-    "attribute_name_2": "-=5.0"
-  }},
-  "plugin_name_2": {{
-    "attribute_name_3": "+=25.5"
-  }}
-}}
-
-【START TASK】
-Output ONLY the JSON object representing the state changes. Do not include any explanations.
-"""
-    
-    user_prompt = f"""[CURRENT BODY STATE]:
-{json.dumps(current_body_state, indent=2)}
-
-[EVENT]:
-\"{event_description}\""""
-
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": REFLEX_MODEL,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        "response_format": { "type": "json_object" }
-    }
+    structured = REFLEX_STRUCTURED_OUTPUT and impact_schema is not None
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(f"{API_BASE_URL}/chat/completions", json=payload, headers=headers, timeout=20.0)
+    def json_mode_payload(model: str) -> dict:
+        return {
+            "model": model,
+            "messages": build_reflex_messages(event_description, current_body_state, organs_schema),
+            "response_format": { "type": "json_object" }
+        }
+
+    async def attempt(model: str, timeout: float) -> dict:
+        use_schema = structured and model not in _json_schema_unsupported
+        if use_schema:
+            # The schema travels in response_format, so the prompt does not repeat it
+            payload = {
+                "model": model,
+                "messages": build_reflex_messages(event_description, current_body_state, structured=True),
+                "response_format": impact_schema.response_format,
+            }
+        else:
+            payload = json_mode_payload(model)
+        with metrics.span("reflex_network"):
+            response = await client_manager.post_chat_completion(payload, timeout=timeout)
+            if use_schema and _rejects_json_schema(response):
+                # A backend without json_schema support; if JSON mode works, stop sending it the schema
+                response = await client_manager.post_chat_completion(json_mode_payload(model), timeout=timeout)
+                if response.is_success:
+                    _json_schema_unsupported.add(model)
+                    print(f"[LLM WARNING] '{model}' rejected response_format json_schema; using JSON mode for it.")
             response.raise_for_status() # Raise an exception for bad status codes
             json_response = response.json()
-            # The actual content is a JSON string inside the response, so we parse it again.
-            return json.loads(json_response['choices'][0]['message']['content'])
-    except (httpx.HTTPStatusError, json.JSONDecodeError, KeyError) as e:
+        metrics.record_usage(model, json_response.get("usage"))
+        # The actual content is a JSON string inside the response, so we parse it again.
+        with metrics.span("reflex_parse"):
+            return _validated_impact(json.loads(json_response['choices'][0]['message']['content']), impact_schema)
+
+    try:
+        return await reflex_caller.call(attempt, _models(REFLEX_MODEL, REFLEX_FALLBACK_MODEL), timeout=20.0)
+    except (httpx.HTTPError, json.JSONDecodeError, KeyError, TimeoutError, DeadlineExceeded) as e:
         print(f"Error calling Reflex API: {e}")
         return None
 
 
-async def get_persona_dialogue(event_description: str, reflex_impact: dict | None, final_body_state: dict, sensations: list[str]) -> str:
+async def get_batched_reflex_impacts(
+    entries: list[tuple[str, dict, str]],
+    organs_schema: str | None = None,
+    impact_schema: ImpactSchema | None = None,
+) -> dict[str, dict] | None:
     """
-    Calls a compatible API to get the persona's dialogue response.
+    Gets the impacts for several bodies with a single completion. `entries` holds (body id, current
+    body state, event description). Returns {body id: impact} for every body the model answered for,
+    or None if the call fails. The answer is keyed by body ids that change from batch to batch, so it
+    uses JSON mode and each body's impact is checked locally against `impact_schema`.
     """
     if not API_KEY:
-        return "[ERROR: OPENAI_API_KEY not found]"
+        print("ERROR: OPENAI_API_KEY not found in environment variables.")
+        return None
+
+    messages = build_batch_reflex_messages(entries, organs_schema)
+
+    async def attempt(model: str, timeout: float) -> dict:
+        payload = {
+            "model": model,
+            "messages": messages,
+            "response_format": { "type": "json_object" }
+        }
+        with metrics.span("reflex_network"):
+            response = await client_manager.post_chat_completion(payload, timeout=timeout)
+            response.raise_for_status()
+            json_response = response.json()
+        metrics.record_usage(model, json_response.get("usage"))
+        with metrics.span("reflex_parse"):
+            return json.loads(json_response['choices'][0]['message']['content'])
 
-    sensation_str = "\n".join(sensations) if sensations else "None"
-    impact_str = json.dumps(reflex_impact, indent=2) if reflex_impact else "None"
+    try:
+        result = await reflex_caller.call(attempt, _models(REFLEX_MODEL, REFLEX_FALLBACK_MODEL), timeout=30.0)
+    except (httpx.HTTPError, json.JSONDecodeError, KeyError, TimeoutError, DeadlineExceeded) as e:
+        print(f"Error calling batched Reflex API: {e}")
+        return None
+    if not isinstance(result, dict):
+        return None
+    return {
+        str(body_id): _validated_impact(impact, impact_schema)
+        for body_id, impact in result.items() if isinstance(impact, dict)
+    }
 
-    system_prompt = """你是一个具有独特个性的女性角色。你名为喵喵。根据当前身体状态、感官体验和发生的事件，生成符合角色个性的对话回应。"""
 
-    user_prompt = f"""[EVENT]:
-"{event_description}"\n
-[ACTION & RESULT]:
-你的身体对该事件的本能反应已经被处理，产生的生理冲击如下：
-{impact_str}
-你的当前身体状态已经体现了这些变化。
+async def summarize_conversation(previous_summary: str, turns: list[tuple[str, str]], max_tokens: int) -> str | None:
+    """
+    Asks the reflex model to fold `turns` into the running conversation summary.
+    Returns the new summary, or None if the call fails.
+    """
+    if not API_KEY:
+        return None
 
-[FINAL BODY STATE]:
-{json.dumps(final_body_state, indent=2)}
+    messages = build_summary_messages(previous_summary, turns, max_tokens)
 
-[CURRENT SENSATIONS]:
-{sensation_str}"""
+    async def attempt(model: str, timeout: float) -> str:
+        response = await client_manager.post_chat_completion({"model": model, "messages": messages}, timeout=timeout)
+        response.raise_for_status()
+        json_response = response.json()
+        metrics.record_usage(model, json_response.get("usage"))
+        return json_response['choices'][0]['message']['content']
 
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
+    try:
+        with metrics.span("memory_summary"):
+            summary = await summary_caller.call(attempt, _models(REFLEX_MODEL, REFLEX_FALLBACK_MODEL), timeout=30.0)
+    except (httpx.HTTPError, json.JSONDecodeError, KeyError, TimeoutError, DeadlineExceeded) as e:
+        print(f"Error calling Summary API: {e}")
+        return None
+    return summary.strip() or None
+
+
+def _build_persona_payload(
+    event_description: str,
+    reflex_impact: dict | None,
+    final_body_state: dict,
+    sensations: list[str],
+    summary: str = "",
+    history: list[tuple[str, str]] = (),
+) -> dict:
+    """Builds the chat completion payload for the persona model."""
+    return {
         "model": PERSONA_MODEL,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        "messages": build_persona_messages(event_description, reflex_impact, final_body_state, sensations, summary, history)
     }
 
+
+async def get_persona_dialogue(
+    event_description: str,
+    reflex_impact: dict | None,
+    final_body_state: dict,
+    sensations: list[str],
+    summary: str = "",
+    history: list[tuple[str, str]] = (),
+) -> str:
+    """
+    Calls a compatible API to get the persona's dialogue response. `summary` and `history`
+    (recent (event, reply) turns) come from the conversation memory.
+    """
+    if not API_KEY:
+        return "[ERROR: OPENAI_API_KEY not found]"
+
+    payload = _build_persona_payload(event_description, reflex_impact, final_body_state, sensations, summary, history)
+
+    async def attempt(model: str, timeout: float) -> str:
+        response = await client_manager.post_chat_completion({**payload, "model": model}, timeout=timeout)
+        response.raise_for_status()
+        json_response = response.json()
+        metrics.record_usage(model, json_response.get("usage"))
+        return json_response['choices'][0]['message']['content']
+
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(f"{API_BASE_URL}/chat/completions", json=payload, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            json_response = response.json()
-            return json_response['choices'][0]['message']['content']
-    except (httpx.HTTPStatusError, json.JSONDecodeError, KeyError) as e:
+        return await persona_caller.call(attempt, _models(PERSONA_MODEL, PERSONA_FALLBACK_MODEL), timeout=30.0)
+    except (httpx.HTTPError, json.JSONDecodeError, KeyError, TimeoutError, DeadlineExceeded) as e:
         return f"[Error calling Persona API: {e}]"
+
+
+async def stream_persona_dialogue(
+    event_description: str,
+    reflex_impact: dict | None,
+    final_body_state: dict,
+    sensations: list[str],
+    summary: str = "",
+    history: list[tuple[str, str]] = (),
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of get_persona_dialogue. Yields pieces of the response as they arrive
+    over server-sent events. Errors are yielded as a single bracketed message, like the string API.
+    Failed attempts are retried (or sent to the fallback model) only until the first token arrives;
+    streams are not hedged.
+    """
+    if not API_KEY:
+        yield "[ERROR: OPENAI_API_KEY not found]"
+        return
+
+    payload = _build_persona_payload(event_description, reflex_impact, final_body_state, sensations, summary, history)
+    payload["stream"] = True
+    if PERSONA_STREAM_USAGE:
+        # Ask for a final chunk carrying the token usage of the whole stream
+        payload["stream_options"] = {"include_usage": True}
+
+    start = time.perf_counter()
+    first_token = True
+    last_error: Exception | None = None
+    loop = asyncio.get_running_loop()
+    try:
+        async for model, timeout in persona_caller.attempts(_models(PERSONA_MODEL, PERSONA_FALLBACK_MODEL), 30.0):
+            # httpx's timeout covers each read; this bounds the whole stream by the attempt's share of the turn
+            expires_at = loop.time() + timeout
+            try:
+                async with asyncio.timeout_at(expires_at) as stream_deadline:
+                    async with client_manager.stream_chat_completion({**payload, "model": model}, timeout=timeout) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            # SSE frames look like "data: {...}"; blank lines and comments are keep-alives.
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                break
+                            chunk = json.loads(data)
+                            metrics.record_usage(model, chunk.get("usage"))
+                            if not chunk.get("choices"):
+                                continue
+                            content = chunk["choices"][0].get("delta", {}).get("content")
+                            if content:
+                                if first_token:
+                                    metrics.observe("persona_first_token", time.perf_counter() - start)
+                                    first_token = False
+                                # Paused while suspended at the yield, so expiry cancels this stream and never the consumer
+                                stream_deadline.reschedule(None)
+                                yield content
+                                stream_deadline.reschedule(expires_at)
+                return
+            except (httpx.HTTPError, json.JSONDecodeError, KeyError, TimeoutError) as e:
+                # Once tokens have been shown, a retry would repeat them
+                if not first_token or not is_retryable(e):
+                    raise
+                last_error = e
+    except (httpx.HTTPError, json.JSONDecodeError, KeyError, TimeoutError, DeadlineExceeded) as e:
+        last_error = e
+    if last_error is None:
+        yield "[Error calling Persona API: the retry budget allowed no attempt]"
+    elif isinstance(last_error, DeadlineExceeded):
+        yield "[Error calling Persona API: no turn time left for another attempt]"
+    elif isinstance(last_error, TimeoutError):
+        yield "[Error calling Persona API: the response ran past the turn deadline]"
+    else:
+        yield f"[Error calling Persona API: {last_error}]"
@@ -1,24 +1,47 @@
+import os
+import asyncio
+from contextlib import nullcontext
 from textual.app import App, ComposeResult
 from textual.widgets import Header, Footer, Static, Input, RichLog
 from textual.containers import Grid, Vertical
 from textual.timer import Timer
+from rich.text import Text
 
 from engine import BodyEngine
-from llm_services import get_reflex_impact, get_persona_dialogue
-from tui_widgets import OrganWidget # Import the default widget
+from sensations import SensationChange
+from llm_services import client_manager, PERSONA_STREAMING
+from pipeline import generate_persona
+from turn_scheduler import TurnScheduler
+from reflex_cache import ReflexCache
+from conversation_memory import ConversationMemory
+from metrics import metrics, METRICS_EXPORT_INTERVAL, METRICS_JSONL_PATH, METRICS_PROMETHEUS_PATH
+from tui_widgets import OrganWidget, MetricsWidget, sparkline, SPARKLINE_WIDTH # Import the default widget
+from history import BodyHistory
+from ticker import EngineTicker, SnapshotView, ENGINE_THREAD
+from persistence import recover_engine, checkpoint_engine, SNAPSHOT_PATH, IMPACT_LOG_PATH, SNAPSHOT_INTERVAL
+
+# Seconds between UI refreshes. Only widgets whose displayed values changed are repainted.
+UI_REFRESH_INTERVAL = float(os.getenv("UI_REFRESH_INTERVAL", "1.0"))
 
 class ChatRPG(App):
     """A Textual app to display the body engine status."""
 
     CSS_PATH = "style.css"
-    BINDINGS = [("d", "toggle_dark", "Toggle dark mode")]
+    BINDINGS = [
+        ("d", "toggle_dark", "Toggle dark mode"),
+        ("ctrl+t", "toggle_metrics", "Toggle metrics"),
+    ]
 
-    engine = BodyEngine()
+    engine = BodyEngine(instrument=True)
+    reflex_cache = ReflexCache()
+    memory = ConversationMemory()
     update_timer: Timer
+    refresh_timer: Timer
 
     def compose(self) -> ComposeResult:
         """Create child widgets for the app."""
         yield Header()
+        yield MetricsWidget(id="metrics")
         
         plugin_widgets = []
         for name, plugin in self.engine.plugins.items():
@@ -35,6 +58,7 @@ class ChatRPG(App):
             Static("Sensations", id="sensations"),
             Vertical(
                 RichLog(id="log", wrap=True, markup=True),
+                Static(id="stream"),
                 Input(placeholder="Enter event or dialogue..."),
                 id="interaction-pane"
             )
@@ -42,79 +66,212 @@ class ChatRPG(App):
         yield Footer()
 
     def _refresh_ui_widgets(self) -> None:
-        """Refreshes all UI widgets with the current engine state."""
-        sensations = self.engine.get_all_sensations()
+        """Refreshes the UI widgets whose displayed values changed since the last render."""
+        with metrics.span("ui_refresh"):
+            self._refresh_changed_widgets()
+        if self.metrics_widget.display:
+            self.metrics_widget.update_metrics(metrics.snapshot())
 
+    def _refresh_changed_widgets(self) -> None:
+        # With the engine on its own thread, read the published snapshot instead of the live plugins
+        snapshot = self.ticker.snapshot if self.ticker is not None else None
         for name, plugin in self.engine.plugins.items():
             try:
-                widget = self.query_one(f"#{name}", Static)
-                state_data = plugin.get_state()
+                state_data = snapshot.plugin_states[name] if snapshot is not None else plugin.get_state()
+                if state_data == self._rendered_states.get(name):
+                    continue
                 # All widgets (default or custom) must have an `update_state` method
-                widget.update_state(state_data)
+                self.organ_widgets[name].update_state(state_data)
+                self._rendered_states[name] = state_data
             except Exception as e:
                 self.log_widget.write(f"[bold white on red]CRITICAL UI ERROR: {e}[/bold white on red]")
         
-        sensation_widget = self.query_one("#sensations", Static)
-        sensation_text = "Sensations:\n" + ("\n".join(sensations) if sensations else "None")
-        sensation_widget.update(sensation_text)
+        self._refresh_trends()
+
+        if snapshot is not None:
+            # The snapshot carries the sensations of the same tick as the states above
+            sensations = snapshot.sensations if snapshot.sensations != self._rendered_sensations else None
+        else:
+            # Taken and cleared in one step, so a change pushed in between is kept for the next refresh
+            sensations, self._pending_sensations = self._pending_sensations, None
+        if sensations is not None:
+            sensation_text = "Sensations:\n" + ("\n".join(sensations) if sensations else "None")
+            self.sensation_widget.update(sensation_text)
+            self._rendered_sensations = sensations
+
+    def _refresh_trends(self) -> None:
+        """Draws a sparkline of each property's recent history in the default organ widgets."""
+        # In thread mode the ticker records history; read it under its lock so no sample is half written
+        with self.ticker.lock if self.ticker is not None else nullcontext():
+            version = self.history.version
+            if version == self._rendered_history_version:
+                return
+            series = {
+                # Copied, since short series are views into the ring buffer
+                prop_name: self.history.series(prop_name, points=SPARKLINE_WIDTH)[1].copy()
+                for prop_name in self.history.property_names
+            }
+        self._rendered_history_version = version
+        for name, plugin in self.engine.plugins.items():
+            widget = self.organ_widgets[name]
+            if not isinstance(widget, OrganWidget):
+                continue
+            widget.update_trends({
+                prop_name: sparkline(values)
+                for prop_name, values in series.items()
+                if self.engine.property_map[prop_name] is plugin
+            })
 
-    def on_mount(self) -> None:
+    def _on_sensations_changed(self, change: SensationChange) -> None:
+        """Queues the new sensations for the next UI refresh."""
+        self._pending_sensations = change.sensations
+
+    async def on_mount(self) -> None:
         """Called when the app is mounted."""
-        self.update_timer = self.set_interval(1.0, self.update_body_state)
+        await client_manager.open()
+        # Widget handles are resolved once; refreshes diff against what was last rendered.
+        self.organ_widgets = {name: self.query_one(f"#{name}", Static) for name in self.engine.plugins}
+        self.sensation_widget = self.query_one("#sensations", Static)
+        self.metrics_widget = self.query_one(MetricsWidget)
+        self._rendered_states: dict[str, dict] = {}
+        self._rendered_sensations: tuple[str, ...] | None = None
+        # Sensations are pushed by the engine when they change instead of being polled every refresh
+        self._pending_sensations: tuple[str, ...] | None = tuple(self.engine.get_all_sensations())
+        self.engine.subscribe_sensations(self._on_sensations_changed)
+        if SNAPSHOT_PATH:
+            # Restore the body from the last snapshot plus everything logged since, then keep logging
+            recover_engine(self.engine, SNAPSHOT_PATH, IMPACT_LOG_PATH)
+            self.set_interval(SNAPSHOT_INTERVAL, self._checkpoint)
+        self.history = BodyHistory(self.engine)
+        self._rendered_history_version = -1
+        if ENGINE_THREAD:
+            # Ticks run off the event loop; the UI and the pipeline see the body through published snapshots
+            self.ticker = EngineTicker(self.engine, on_tick=self.history.record)
+            self.body = SnapshotView(self.ticker)
+            self.ticker.start()
+        else:
+            self.ticker = None
+            self.body = self.engine
+            self.update_timer = self.set_interval(1.0, self.update_body_state)
+        self.refresh_timer = self.set_interval(UI_REFRESH_INTERVAL, self._refresh_ui_widgets)
+        if METRICS_JSONL_PATH or METRICS_PROMETHEUS_PATH:
+            self.set_interval(METRICS_EXPORT_INTERVAL, metrics.export)
         self.log_widget = self.query_one(RichLog)
+        self.turn_scheduler = TurnScheduler(
+            self.body,
+            self._handle_reflex,
+            self._handle_persona,
+            self._handle_turn_error,
+            reflex_cache=self.reflex_cache,
+        )
+        self.turn_scheduler.start()
         self.log_widget.write("[bold green]Body engine started.[/bold green] Enter an event (e.g., *a cold wind blows*) or dialogue.")
         self.call_later(self.query_one(Input).focus)
 
+    async def on_unmount(self) -> None:
+        """Called when the app is shutting down."""
+        await self.turn_scheduler.stop()
+        await self.memory.close()
+        if self.ticker is not None:
+            self.ticker.stop()
+        self.engine.close()
+        if SNAPSHOT_PATH:
+            self._checkpoint()
+            if self.engine.journal is not None:
+                self.engine.journal.close()
+        await client_manager.close()
+        self.reflex_cache.close()
+
+    async def _stream_persona_response(self, user_input: str, reflex_impact: dict | None) -> str:
+        """Shows streamed tokens below the log as they arrive and returns the full response."""
+        # RichLog cannot edit a line once written, so the in-progress reply lives in its own widget
+        # and is moved into the log when the stream ends.
+        stream_widget = self.query_one("#stream", Static)
+        stream_widget.display = True
+        response = ""
+
+        def show_token(token: str) -> None:
+            nonlocal response
+            response += token
+            stream_widget.update(Text.assemble(("AI: ", "bold green"), response))
+
+        try:
+            return await generate_persona(
+                self.body, user_input, reflex_impact, on_token=show_token, stream=True, memory=self.memory
+            )
+        finally:
+            stream_widget.update("")
+            stream_widget.display = False
+
+    def _checkpoint(self) -> None:
+        if self.ticker is not None:
+            # Keep the ticker thread from changing plugins halfway through the snapshot
+            with self.ticker.lock:
+                checkpoint_engine(self.engine, SNAPSHOT_PATH)
+            return
+        checkpoint_engine(self.engine, SNAPSHOT_PATH)
+
     def update_body_state(self) -> None:
-        """Update the body state and refresh widgets."""
+        """Advance the body state and record it. Widgets are refreshed by their own timer."""
         self.engine.update()
-        self._refresh_ui_widgets()
+        self.history.record()
 
     async def on_input_submitted(self, message: Input.Submitted) -> None:
-        """Handle user input."""
+        """Handle user input. The engine keeps ticking while the turn scheduler processes it."""
         user_input = message.value
         if not user_input:
             return
-        
-        self.update_timer.pause()
-        self.log_widget.write("[silver][INFO] Autonomous engine paused.[/silver]")
 
-        try:
-            self.query_one(Input).value = ""
-            self.log_widget.write(f"You: {user_input}")
-
-            # Generate schema for precise LLM reflection
-            organs_schema = self.engine.get_organs_schema()
-            reflex_impact = await get_reflex_impact(user_input, self.engine.get_full_state(), organs_schema)
-
-            if reflex_impact:
-                self.engine.apply_impact(reflex_impact)
-                formatted_impact_messages = []
-                for system_name, attributes in reflex_impact.items():
-                    for attribute, operator_value in attributes.items():
-                        formatted_impact_messages.append(f"{attribute} {operator_value}")
-                
-                if formatted_impact_messages:
-                    impact_text = "\n".join(formatted_impact_messages)
-                    self.log_widget.write(f"[yellow]{impact_text}[/yellow]")
-                else:
-                    self.log_widget.write("[yellow]Body state updated based on reflex.[/yellow]") # Fallback if no specific changes
-                
-                self._refresh_ui_widgets()
+        self.query_one(Input).value = ""
+        self.log_widget.write(f"You: {user_input}")
+        self.turn_scheduler.submit(user_input)
+
+    def _handle_reflex(self, events: list[str], reflex_impact: dict | None, cache_hit: bool) -> None:
+        """Logs the impact the scheduler just applied for a batch of events."""
+        if len(events) > 1:
+            self.log_widget.write(f"[silver][INFO] Coalesced {len(events)} events into one reflex.[/silver]")
+        if cache_hit:
+            self.log_widget.write("[silver][INFO] Reflex cache hit.[/silver]")
+
+        if reflex_impact:
+            formatted_impact_messages = []
+            for system_name, attributes in reflex_impact.items():
+                for attribute, operator_value in attributes.items():
+                    # Impacts from the LLM carry numeric deltas; older cached ones may still be "+=VALUE" strings
+                    change = f"{operator_value:+g}" if isinstance(operator_value, (int, float)) else operator_value
+                    formatted_impact_messages.append(f"{attribute} {change}")
             
-            persona_response = await get_persona_dialogue(
-                user_input, 
-                reflex_impact,
-                self.engine.get_full_state(), 
-                self.engine.get_all_sensations()
-            )
+            if formatted_impact_messages:
+                impact_text = "\n".join(formatted_impact_messages)
+                self.log_widget.write(f"[yellow]{impact_text}[/yellow]")
+            else:
+                self.log_widget.write("[yellow]Body state updated based on reflex.[/yellow]") # Fallback if no specific changes
             
-            self.log_widget.write(f"[bold green]AI:[/bold green] {persona_response}")
-        except Exception as e:
-            self.log_widget.write(f"[bold white on red]CRITICAL APPLICATION ERROR: {e}[/bold white on red]")
-        finally:
-            self.update_timer.resume()
-            self.log_widget.write("[silver][INFO] Autonomous engine resumed.[/silver]")
+            self._refresh_ui_widgets()
+
+    async def _handle_persona(self, event_description: str, reflex_impact: dict | None) -> None:
+        """Generates and logs the persona's reply for a batch of events."""
+        try:
+            if PERSONA_STREAMING:
+                persona_response = await self._stream_persona_response(event_description, reflex_impact)
+            else:
+                persona_response = await generate_persona(
+                    self.body, event_description, reflex_impact, stream=False, memory=self.memory
+                )
+        except asyncio.CancelledError:
+            self.log_widget.write("[silver][INFO] Reply superseded by newer events.[/silver]")
+            raise
+
+        self.log_widget.write(f"[bold green]AI:[/bold green] {persona_response}")
+
+    def _handle_turn_error(self, error: Exception) -> None:
+        self.log_widget.write(f"[bold white on red]CRITICAL APPLICATION ERROR: {error}[/bold white on red]")
+
+    def action_toggle_metrics(self) -> None:
+        """Show or hide the metrics panel."""
+        self.metrics_widget.display = not self.metrics_widget.display
+        if self.metrics_widget.display:
+            self.metrics_widget.update_metrics(metrics.snapshot())
 
     def action_toggle_dark(self) -> None:
         """An action to toggle dark mode."""
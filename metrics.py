@@ -0,0 +1,137 @@
+import os
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Number of recent samples each stage keeps for its percentiles
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1024"))
+# Optional exporter targets, written every METRICS_EXPORT_INTERVAL seconds by the TUI
+METRICS_JSONL_PATH = os.getenv("METRICS_JSONL_PATH")
+METRICS_PROMETHEUS_PATH = os.getenv("METRICS_PROMETHEUS_PATH")
+METRICS_EXPORT_INTERVAL = float(os.getenv("METRICS_EXPORT_INTERVAL", "10"))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    """Keeps the most recent samples for percentiles, plus lifetime count and sum."""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.samples: deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self, qs=QUANTILES) -> dict[float, float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in qs}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in qs}
+
+    @property
+    def last(self) -> float:
+        return self.samples[-1] if self.samples else 0.0
+
+
+class MetricsRegistry:
+    """Collects per-stage latencies, event counters and LLM token usage for the TUI panel and exporters."""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.window = window
+        self.stages: dict[str, RollingHistogram] = {}
+        self.counters: dict[str, int] = {}
+        self.token_usage: dict[str, dict[str, int]] = {}
+
+    def observe(self, stage: str, seconds: float):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = RollingHistogram(self.window)
+        histogram.observe(seconds)
+
+    def increment(self, counter: str, amount: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    @contextmanager
+    def span(self, stage: str):
+        """Times the enclosed block and records it under `stage`, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def record_usage(self, model: str, usage: dict | None):
+        """Adds the `usage` block of a completion response to the per-model token counters."""
+        if not usage:
+            return
+        counters = self.token_usage.setdefault(
+            model, {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        )
+        counters["requests"] += 1
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            counters[key] += int(usage.get(key) or 0)
+
+    def snapshot(self) -> dict:
+        return {
+            "timestamp": time.time(),
+            "stages": {
+                stage: {
+                    "count": histogram.count,
+                    "sum": histogram.total,
+                    "last": histogram.last,
+                    **{f"p{int(q * 100)}": value for q, value in histogram.quantiles().items()},
+                }
+                for stage, histogram in self.stages.items()
+            },
+            "counters": dict(self.counters),
+            "tokens": {model: dict(counters) for model, counters in self.token_usage.items()},
+        }
+
+    def to_prometheus(self) -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP chatrpg_stage_seconds Latency of turn pipeline stages.",
+            "# TYPE chatrpg_stage_seconds summary",
+        ]
+        for stage, histogram in self.stages.items():
+            for q, value in histogram.quantiles().items():
+                lines.append(f'chatrpg_stage_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'chatrpg_stage_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+            lines.append(f'chatrpg_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        lines.append("# HELP chatrpg_events_total Counted pipeline events (retries, hedges, fallbacks, ...).")
+        lines.append("# TYPE chatrpg_events_total counter")
+        for counter, value in self.counters.items():
+            lines.append(f'chatrpg_events_total{{event="{counter}"}} {value}')
+        lines.append("# HELP chatrpg_llm_tokens_total Tokens reported in completion usage.")
+        lines.append("# TYPE chatrpg_llm_tokens_total counter")
+        for model, counters in self.token_usage.items():
+            for kind in ("prompt", "completion"):
+                lines.append(f'chatrpg_llm_tokens_total{{model="{model}",kind="{kind}"}} {counters[f"{kind}_tokens"]}')
+        lines.append("# HELP chatrpg_llm_requests_total Completion responses that reported usage.")
+        lines.append("# TYPE chatrpg_llm_requests_total counter")
+        for model, counters in self.token_usage.items():
+            lines.append(f'chatrpg_llm_requests_total{{model="{model}"}} {counters["requests"]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, jsonl_path: str | None = METRICS_JSONL_PATH, prometheus_path: str | None = METRICS_PROMETHEUS_PATH):
+        """Appends a snapshot to the JSONL file and rewrites the Prometheus text file, when configured."""
+        if jsonl_path:
+            with open(jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.snapshot()) + "\n")
+        if prometheus_path:
+            # Write then rename so a scraper never reads a half-written file
+            tmp_path = f"{prometheus_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, prometheus_path)
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,261 @@
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+from dataclasses import dataclass
+import numpy as np
+from dotenv import load_dotenv
+from clock import VirtualClock
+
+load_dotenv()
+
+# Where the TUI keeps its body snapshot and impact log; persistence is off unless SNAPSHOT_PATH is set
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH")
+IMPACT_LOG_PATH = os.getenv("IMPACT_LOG_PATH") or (f"{SNAPSHOT_PATH}.log" if SNAPSHOT_PATH else None)
+# Seconds between checkpoints (snapshot + log truncation) while the TUI runs
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "300"))
+# fsync the impact log after every record instead of leaving it to the OS
+IMPACT_LOG_FSYNC = os.getenv("IMPACT_LOG_FSYNC", "false").lower() in ("1", "true", "yes")
+
+SNAPSHOT_MAGIC = b"CRPGSNAP"
+SNAPSHOT_VERSION = 1
+# magic, version, flags, property count, body count, timestamp, last log sequence included, names length
+_HEADER = struct.Struct("<8sHHIIdQI")
+
+# crc32 of the rest, kind, sequence, timestamp, body id, tick duration, payload length
+_RECORD = struct.Struct("<IBQdIdI")
+RECORD_TICK = 1
+RECORD_IMPACT = 2
+
+
+@dataclass
+class Snapshot:
+    """A decoded snapshot. `values` has one row per property and one column per body."""
+    property_names: list[str]
+    values: np.ndarray
+    timestamp: float
+    last_sequence: int
+
+
+def property_layout(engine) -> list[tuple[str, object, str]]:
+    """(qualified "plugin.property" name, plugin, private attribute) for every registered property, grouped by plugin."""
+    layout = []
+    for name, plugin in engine.plugins.items():
+        for prop_name, owner_plugin in engine.property_map.items():
+            if owner_plugin is plugin:
+                layout.append((f"{name}.{prop_name}", plugin, getattr(type(plugin), prop_name)._private_name))
+    return layout
+
+
+def write_snapshot(path: str, property_names: list[str], values: np.ndarray, timestamp: float | None = None, last_sequence: int = 0):
+    """Writes a header, the property names and the packed float64 values. Replaces `path` atomically."""
+    values = np.ascontiguousarray(values, dtype="<f8").reshape(len(property_names), -1)
+    names = "\n".join(property_names).encode("utf-8")
+    header = _HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, len(property_names), values.shape[1],
+        time.time() if timestamp is None else timestamp, last_sequence, len(names),
+    )
+    # Pad so the float block starts 8-byte aligned and can be viewed in place through mmap
+    padding = b"\0" * (-(len(header) + len(names)) % 8)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(names)
+        f.write(padding)
+        f.write(values.data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> Snapshot:
+    """Maps a snapshot file and copies the float block out in one pass; the mapping is closed on return."""
+    with open(path, "rb") as f:
+        # mmap cannot map an empty file, and anything shorter than the header is not a snapshot
+        if os.fstat(f.fileno()).st_size < _HEADER.size:
+            raise ValueError(f"'{path}' is too short to be a body snapshot")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, version, _, n_props, n_bodies, timestamp, last_sequence, names_len = _HEADER.unpack_from(mapped)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"'{path}' is not a body snapshot")
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported snapshot version {version} in '{path}'")
+            names_end = _HEADER.size + names_len
+            property_names = bytes(mapped[_HEADER.size:names_end]).decode("utf-8").split("\n") if n_props else []
+            offset = names_end + (-names_end % 8)
+            values = np.frombuffer(mapped, dtype="<f8", count=n_props * n_bodies, offset=offset).reshape(n_props, n_bodies).copy()
+    return Snapshot(property_names, values, timestamp, last_sequence)
+
+
+def _rows_by_name(snapshot: Snapshot, property_names: list[str]) -> list[tuple[int, int]]:
+    """(snapshot row, target row) for every property present in both; others keep their current values."""
+    snapshot_rows = {name: i for i, name in enumerate(snapshot.property_names)}
+    return [(snapshot_rows[name], row) for row, name in enumerate(property_names) if name in snapshot_rows]
+
+
+def save_engine(engine, path: str, last_sequence: int | None = None):
+    layout = property_layout(engine)
+    values = np.array([[getattr(plugin, private_name)] for _, plugin, private_name in layout], dtype=float)
+    if last_sequence is None:
+        last_sequence = engine.journal.sequence if engine.journal is not None else 0
+    write_snapshot(path, [name for name, _, _ in layout], values, last_sequence=last_sequence)
+
+
+def load_engine(engine, path: str) -> Snapshot:
+    """Restores an engine from a single-body snapshot. Properties the snapshot does not know keep their defaults."""
+    snapshot = read_snapshot(path)
+    layout = property_layout(engine)
+    for snapshot_row, row in _rows_by_name(snapshot, [name for name, _, _ in layout]):
+        _, plugin, private_name = layout[row]
+        setattr(plugin, private_name, float(snapshot.values[snapshot_row, 0]))
+    return snapshot
+
+
+def population_property_names(population) -> list[str]:
+    property_map = population.template.property_map
+    return [f"{property_map[prop_name].name}.{prop_name}" for prop_name in population.property_names]
+
+
+def save_population(population, path: str, last_sequence: int | None = None):
+    if last_sequence is None:
+        last_sequence = population.journal.sequence if population.journal is not None else 0
+    write_snapshot(path, population_property_names(population), population.state[:, :population.count], last_sequence=last_sequence)
+
+
+def load_population(population, path: str) -> Snapshot:
+    """Adds one body per snapshot column to `population` (normally empty) and copies the values in bulk."""
+    snapshot = read_snapshot(path)
+    bodies = population.add_bodies(snapshot.values.shape[1])
+    rows = _rows_by_name(snapshot, population_property_names(population))
+    if rows:
+        source, target = zip(*rows)
+        population.state[list(target), bodies.start:bodies.stop] = snapshot.values[list(source)]
+    return snapshot
+
+
+class ImpactLog:
+    """
+    Append-only log of applied impacts and ticks. Each record carries a sequence number and a CRC,
+    so replay skips what a snapshot already contains and stops at a torn final record.
+    """
+
+    def __init__(self, path: str, start_sequence: int = 0, fsync: bool = IMPACT_LOG_FSYNC):
+        self.path = path
+        self.fsync = fsync
+        # Continue after the snapshot's last sequence, even when the log was truncated by a checkpoint
+        self.sequence = start_sequence
+        valid_end = 0
+        for end, record in self._scan(path):
+            self.sequence = max(self.sequence, record[1])
+            valid_end = end
+        self._file = open(path, "ab")
+        # Cut off a torn tail, or records appended after it could never be read back
+        if self._file.tell() > valid_end:
+            self._file.truncate(valid_end)
+
+    def log_tick(self, timestamp: float, tick_duration: float):
+        self._append(RECORD_TICK, timestamp, 0, tick_duration, b"")
+
+    def log_impact(self, timestamp: float, impact: dict, body_id: int = 0):
+        payload = json.dumps(impact, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        self._append(RECORD_IMPACT, timestamp, body_id, 0.0, payload)
+
+    def _append(self, kind: int, timestamp: float, body_id: int, tick_duration: float, payload: bytes):
+        self.sequence += 1
+        body = _RECORD.pack(0, kind, self.sequence, timestamp, body_id, tick_duration, len(payload))[4:] + payload
+        self._file.write(struct.pack("<I", zlib.crc32(body)) + body)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def truncate(self):
+        """Drops every record; call after a snapshot that includes them has been written. Sequence numbers keep counting."""
+        self._file.close()
+        self._file = open(self.path, "wb")
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def read(path: str):
+        """Yields (kind, sequence, timestamp, body id, tick duration, impact) records in order."""
+        for _, record in ImpactLog._scan(path):
+            yield record
+
+    @staticmethod
+    def _scan(path: str):
+        """Yields (end offset, record) for every intact record."""
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + _RECORD.size <= len(data):
+            crc, kind, sequence, timestamp, body_id, tick_duration, length = _RECORD.unpack_from(data, offset)
+            end = offset + _RECORD.size + length
+            if end > len(data) or zlib.crc32(data[offset + 4:end]) != crc:
+                # A torn or corrupt record can only be the tail of an interrupted write
+                break
+            payload = data[offset + _RECORD.size:end]
+            impact = json.loads(payload) if kind == RECORD_IMPACT else None
+            yield end, (kind, sequence, timestamp, body_id, tick_duration, impact)
+            offset = end
+
+
+def replay(target, log_path: str, after_sequence: int = 0) -> int:
+    """
+    Re-applies the ticks and impacts logged after `after_sequence` to a BodyEngine or BodyPopulation.
+    Returns the number of records replayed.
+    """
+    journal, target.journal = target.journal, None
+    # A lazy engine fast-forwards to its clock before every impact, which would integrate live wall time on
+    # top of the logged ticks. Its clock is pinned to each record's time instead, so only logged ticks count.
+    lazy = getattr(target, "lazy", False)
+    clock = target.clock
+    if lazy:
+        target.clock = VirtualClock()
+    replayed = 0
+    try:
+        for kind, sequence, timestamp, body_id, tick_duration, impact in ImpactLog.read(log_path):
+            if sequence <= after_sequence:
+                continue
+            if lazy:
+                target.clock.time = target.last_update_time = timestamp
+            if kind == RECORD_TICK:
+                target.step(tick_duration)
+            elif hasattr(target, "count"):
+                target.apply_impact(body_id, impact)
+            else:
+                target.apply_impact(impact)
+            replayed += 1
+    finally:
+        target.journal = journal
+        target.clock = clock
+    return replayed
+
+
+def recover_engine(engine, snapshot_path: str, log_path: str | None) -> ImpactLog | None:
+    """
+    Loads the snapshot (if any), replays the log on top of it, and attaches the log to the engine so
+    new ticks and impacts are recorded. Returns the attached log.
+    """
+    last_sequence = 0
+    # An empty file (e.g. left by a crash before the first checkpoint) counts as no snapshot
+    if os.path.exists(snapshot_path) and os.path.getsize(snapshot_path) > 0:
+        last_sequence = load_engine(engine, snapshot_path).last_sequence
+    if not log_path:
+        return None
+    replayed = replay(engine, log_path, last_sequence)
+    if replayed:
+        print(f"[Persistence] Replayed {replayed} logged records from '{log_path}'")
+    engine.journal = ImpactLog(log_path, start_sequence=last_sequence)
+    return engine.journal
+
+
+def checkpoint_engine(engine, snapshot_path: str):
+    """Writes a snapshot that includes everything logged so far, then empties the log."""
+    save_engine(engine, snapshot_path)
+    if engine.journal is not None:
+        engine.journal.truncate()
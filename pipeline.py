@@ -0,0 +1,121 @@
+import inspect
+from dataclasses import dataclass
+from typing import Callable
+
+from llm_services import get_reflex_impact, get_persona_dialogue, stream_persona_dialogue, PERSONA_STREAMING
+from reflex_cache import ReflexCache
+from reflex_batcher import ReflexBatcher
+from conversation_memory import ConversationMemory
+from metrics import metrics
+from resilience import turn_deadline
+
+
+@dataclass
+class TurnResult:
+    """The outcome of one reflex -> apply_impact -> persona turn."""
+    reflex_impact: dict | None
+    cache_hit: bool
+    persona_response: str
+
+
+async def resolve_reflex(
+    engine,
+    user_input: str,
+    reflex_cache: ReflexCache | None = None,
+    batcher: ReflexBatcher | None = None,
+    body_key: str | None = None,
+) -> tuple[dict | None, bool]:
+    """
+    Gets the reflex impact of an event (from the cache when possible) and applies it to the engine.
+    With a `batcher`, the call is shared with other bodies' events; `body_key` identifies this body
+    in the batch. Returns the impact and whether it came from the cache.
+    """
+    # Generate schema for precise LLM reflection
+    with metrics.span("schema_build"):
+        organs_schema = engine.get_organs_schema()
+        impact_schema = engine.get_impact_schema()
+    reflex_impact = None
+    cache_key = None
+    if reflex_cache is not None:
+        # Repeated events against a similar body state reuse the earlier reflex instead of calling the LLM
+        cache_key = reflex_cache.make_key(user_input, engine.get_full_state(), organs_schema)
+        reflex_impact = reflex_cache.get(cache_key)
+    cache_hit = reflex_impact is not None
+    if not cache_hit:
+        with metrics.span("reflex"):
+            if batcher is not None:
+                reflex_impact = await batcher.submit(
+                    body_key or str(id(engine)), user_input, engine.get_raw_state(), organs_schema, impact_schema
+                )
+            else:
+                reflex_impact = await get_reflex_impact(user_input, engine.get_raw_state(), organs_schema, impact_schema)
+
+    if reflex_impact:
+        with metrics.span("apply_impact"):
+            applied = engine.apply_impact(reflex_impact)
+            # A ticker.SnapshotView applies on the engine thread; wait until the impact is in its snapshot
+            if inspect.isawaitable(applied):
+                await applied
+        if cache_key is not None and not cache_hit:
+            reflex_cache.put(cache_key, reflex_impact)
+    return reflex_impact, cache_hit
+
+
+async def generate_persona(
+    engine,
+    user_input: str,
+    reflex_impact: dict | None,
+    on_token: Callable[[str], None] | None = None,
+    stream: bool = PERSONA_STREAMING,
+    memory: ConversationMemory | None = None,
+) -> str:
+    """
+    Gets the persona's reply to the event. When streaming, `on_token` receives each piece as it arrives.
+    With a `memory`, the summary and recent turns are sent along and the finished turn is recorded.
+    """
+    summary, history = memory.context() if memory is not None else ("", [])
+    with metrics.span("persona"):
+        if not stream:
+            response = await get_persona_dialogue(
+                user_input,
+                reflex_impact,
+                engine.get_raw_state(),
+                engine.get_all_sensations(),
+                summary,
+                history
+            )
+        else:
+            response = ""
+            async for token in stream_persona_dialogue(
+                user_input,
+                reflex_impact,
+                engine.get_raw_state(),
+                engine.get_all_sensations(),
+                summary,
+                history
+            ):
+                response += token
+                if on_token is not None:
+                    on_token(token)
+
+    # Error placeholders are not part of the conversation
+    if memory is not None and not response.startswith(("[Error", "[ERROR")):
+        memory.add_turn(user_input, response)
+    return response
+
+
+async def run_turn(
+    engine,
+    user_input: str,
+    reflex_cache: ReflexCache | None = None,
+    on_token: Callable[[str], None] | None = None,
+    stream: bool = PERSONA_STREAMING,
+    batcher: ReflexBatcher | None = None,
+    body_key: str | None = None,
+    memory: ConversationMemory | None = None,
+) -> TurnResult:
+    """Runs a complete turn against `engine`, which may be a BodyEngine, a BodyView or a ticker.SnapshotView."""
+    with turn_deadline():
+        reflex_impact, cache_hit = await resolve_reflex(engine, user_input, reflex_cache, batcher, body_key)
+        persona_response = await generate_persona(engine, user_input, reflex_impact, on_token, stream, memory)
+    return TurnResult(reflex_impact, cache_hit, persona_response)
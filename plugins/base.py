@@ -1,10 +1,19 @@
+import operator
 from abc import ABC, abstractmethod
-from typing import Type
-from textual.widget import Widget
+from typing import Type, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # Only the TUI needs widgets; keep Textual out of headless engine imports.
+    from textual.widget import Widget
 
 class OrganPlugin(ABC):
     """The interface that all organ plugins must implement."""
 
+    # Registered properties of other plugins that `update` reads. Their writers are updated first.
+    reads: tuple[str, ...] = ()
+    # Properties that `update` writes; None means the plugin's own OrganProperties
+    writes: tuple[str, ...] | None = None
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -20,39 +29,108 @@ class OrganPlugin(ABC):
     def __init__(self, engine):
         self.engine = engine
 
-    def register_properties(self):
-        """Inspects the plugin for OrganProperty descriptors and registers them with the engine."""
+    def register_properties(self, prop_names: list[str] | None = None):
+        """
+        Inspects the plugin for OrganProperty descriptors and registers them with the engine.
+        If `prop_names` is given (e.g. from the plugin manifest), those are registered without inspection.
+        """
+        if prop_names is not None:
+            for prop_name in prop_names:
+                self.engine.register_property(prop_name, self)
+            return
         for attr_name in dir(self.__class__):
             attr_value = getattr(self.__class__, attr_name)
             if isinstance(attr_value, OrganProperty):
                 self.engine.register_property(attr_name, self)
 
+    def bind(self) -> None:
+        """
+        Called once every plugin is loaded, before the first tick (and again if plugins register later).
+        Look up the plugins you depend on here rather than on every update.
+        """
+        pass
+
     @abstractmethod
     def update(self, tick_duration: float) -> None:
         """Called by the engine on every tick to update the plugin's state."""
         pass
 
-    @abstractmethod
     def get_sensations(self) -> list[str]:
-        """Return a list of strings describing current sensations."""
-        pass
+        """
+        Return a list of strings describing current sensations. By default this evaluates the Sensation
+        rules declared on the plugin's properties, without hysteresis. Plugins may override it instead;
+        the engine then polls it rather than tracking the declared rules.
+        """
+        return [rule.text for prop_name, rule in self.sensation_rules() if rule.is_active(getattr(self, prop_name))]
+
+    @classmethod
+    def sensation_rules(cls) -> list[tuple[str, "Sensation"]]:
+        """The (property name, Sensation) pairs declared on this plugin's properties, in declaration order."""
+        rules = cls.__dict__.get("_sensation_rules")
+        if rules is None:
+            rules = []
+            for klass in reversed(cls.__mro__):
+                for attr_name, attr_value in vars(klass).items():
+                    if isinstance(attr_value, OrganProperty):
+                        rules.extend((attr_name, rule) for rule in attr_value.sensations)
+            cls._sensation_rules = rules
+        return rules
 
     @abstractmethod
     def get_state(self) -> dict[str, str]:
         """Return a dictionary of states for TUI display."""
         pass
 
-    def get_widget_class(self) -> Type[Widget] | None:
+    def advance(self, elapsed: float) -> None:
+        """
+        Optionally jump the plugin's state forward by `elapsed` seconds in a single closed-form step.
+        Used by lazily integrated engines; plugins that do not override this are sub-stepped through `update`.
+        """
+        pass
+
+    def batch_update(self, columns: dict, tick_duration: float) -> None:
+        """
+        Optionally advance many bodies at once. `columns` maps every registered property name to a
+        NumPy array indexed by body id; update them in place. Clamping is applied by the caller.
+        Plugins that do not override this fall back to a per-body `update` loop.
+        """
+        pass
+
+    def get_widget_class(self) -> "Type[Widget] | None":
         """Optionally return a custom Textual Widget class for this plugin."""
         return None
 
+class Sensation:
+    """
+    A sensation reported while a property compares true against a threshold (e.g. `Sensation(">", 100, "...")`).
+    Once active, it stays active until the value has moved `hysteresis` back past the threshold.
+    """
+    _COMPARATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+    def __init__(self, comparator: str, threshold: float, text: str, hysteresis: float = 0.0):
+        if comparator not in self._COMPARATORS:
+            raise ValueError(f"Unsupported sensation comparator '{comparator}'")
+        self.comparator = comparator
+        self.threshold = threshold
+        self.text = text
+        self.hysteresis = hysteresis
+        self._compare = self._COMPARATORS[comparator]
+        # Once active, the threshold moves back by the hysteresis band
+        band = -hysteresis if comparator.startswith(">") else hysteresis
+        self.release_threshold = threshold + band
+
+    def is_active(self, value: float, was_active: bool = False) -> bool:
+        return self._compare(value, self.release_threshold if was_active else self.threshold)
+
+
 class OrganProperty:
     """A descriptor for a property of an organ that automatically handles min/max clamping."""
-    def __init__(self, default, min_val=None, max_val=None, description=""):
+    def __init__(self, default, min_val=None, max_val=None, description="", sensations: tuple[Sensation, ...] = ()):
         self.default = default
         self.min_val = min_val
         self.max_val = max_val
         self.description = description
+        self.sensations = tuple(sensations)
         self._private_name = None
 
     def __set_name__(self, owner, name):
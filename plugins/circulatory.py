@@ -1,11 +1,17 @@
-from plugins.base import OrganPlugin, OrganProperty
+from plugins.base import OrganPlugin, OrganProperty, Sensation
 
 
 class CirculatoryPlugin(OrganPlugin):
     name = "circulatory"
     display_name = "循环系统"
 
-    heart_rate = OrganProperty(default=70.0, min_val=0, description="The current heart rate in beats per minute.")
+    heart_rate = OrganProperty(
+        default=70.0, min_val=0, description="The current heart rate in beats per minute.",
+        sensations=[
+            Sensation(">", 100, "[体感: 心跳加速, 紧张]", hysteresis=5),
+            Sensation(">", 140, "[体感: 心悸, 胸闷]", hysteresis=5),
+        ],
+    )
 
     def __init__(self, engine):
         super().__init__(engine)
@@ -20,13 +26,18 @@ class CirculatoryPlugin(OrganPlugin):
         else:
             self.heart_rate += 0.5 * tick_duration
 
-    def get_sensations(self) -> list[str]:
-        s = []
-        if self.heart_rate > 100:
-            s.append("[体感: 心跳加速, 紧张]")
-        if self.heart_rate > 140:
-            s.append("[体感: 心悸, 胸闷]")
-        return s
+    def advance(self, elapsed: float):
+        # Relax toward the base rate at 0.5 BPM/s, stopping once it is reached.
+        change = 0.5 * elapsed
+        if self.heart_rate > self.base_heart_rate:
+            self.heart_rate = max(self.base_heart_rate, self.heart_rate - change)
+        else:
+            self.heart_rate = min(self.base_heart_rate, self.heart_rate + change)
+
+    def batch_update(self, columns: dict, tick_duration: float):
+        heart_rate = columns["heart_rate"]
+        # (mask - 0.5) is +0.5 above the base rate and -0.5 at or below it
+        heart_rate -= ((heart_rate > self.base_heart_rate) - 0.5) * tick_duration
 
     def get_state(self) -> dict[str, str]:
         return {
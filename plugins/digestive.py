@@ -1,4 +1,4 @@
-from plugins.base import OrganPlugin, OrganProperty
+from plugins.base import OrganPlugin, OrganProperty, Sensation
 
 
 class DigestivePlugin(OrganPlugin):
@@ -6,10 +6,16 @@ class DigestivePlugin(OrganPlugin):
     display_name = "消化系统"
 
     fullness = OrganProperty(
-        default=80.0, min_val=0, max_val=100, description="How full the stomach is."
+        default=80.0, min_val=0, max_val=100, description="How full the stomach is.",
+        sensations=[
+            Sensation("<", 20, "[体感: 胃部空虚, 轻微饥饿感]", hysteresis=2),
+            Sensation("<", 5, "[体感: 强烈的饥饿感, 胃部痉挛]", hysteresis=1),
+            Sensation(">", 95, "[体感: 腹胀, 轻微不适]", hysteresis=2),
+        ],
     )
     nutrient_buffer = OrganProperty(
-        default=50.0, min_val=0, max_val=100, description="Short-term energy reserves."
+        default=50.0, min_val=0, max_val=100, description="Short-term energy reserves.",
+        sensations=[Sensation("<", 10, "[体感: 全身无力, 头晕]", hysteresis=1)],
     )
 
     def __init__(self, engine):
@@ -25,17 +31,21 @@ class DigestivePlugin(OrganPlugin):
         # Passive nutrient drain
         self.nutrient_buffer -= 0.01 * tick_duration
 
-    def get_sensations(self) -> list[str]:
-        s = []
-        if self.fullness < 20:
-            s.append("[体感: 胃部空虚, 轻微饥饿感]")
-        if self.fullness < 5:
-            s.append("[体感: 强烈的饥饿感, 胃部痉挛]")
-        if self.fullness > 95:
-            s.append("[体感: 腹胀, 轻微不适]")
-        if self.nutrient_buffer < 10:
-            s.append("[体感: 全身无力, 头晕]")
-        return s
+    def advance(self, elapsed: float):
+        # Digestion runs until the stomach is empty; the passive drain applies throughout.
+        digesting_time = min(elapsed, self.fullness / self.digest_rate) if self.fullness > 0 else 0.0
+        self.fullness -= self.digest_rate * digesting_time
+        self.nutrient_buffer += (self.digest_rate * 0.5 - 0.01) * digesting_time
+        self.nutrient_buffer -= 0.01 * (elapsed - digesting_time)
+
+    def batch_update(self, columns: dict, tick_duration: float):
+        fullness = columns["fullness"]
+        nutrient_buffer = columns["nutrient_buffer"]
+        digesting = fullness > 0
+        digested_amount = self.digest_rate * tick_duration
+        fullness -= digesting * digested_amount
+        nutrient_buffer += digesting * (digested_amount * 0.5)
+        nutrient_buffer -= 0.01 * tick_duration
 
     def get_state(self) -> dict[str, str]:
         return {
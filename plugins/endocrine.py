@@ -1,13 +1,22 @@
-from plugins.base import OrganPlugin, OrganProperty
+from plugins.base import OrganPlugin, OrganProperty, Sensation
 
 
 class EndocrinePlugin(OrganPlugin):
     name = "endocrine"
     display_name = "内分泌系统"
 
-    adrenaline = OrganProperty(default=0.0, min_val=0, max_val=100, description="Fight-or-flight hormone.")
-    cortisol = OrganProperty(default=10.0, min_val=0, max_val=100, description="Stress hormone.")
-    endorphins = OrganProperty(default=20.0, min_val=0, max_val=100, description="Pain and stress-reducing hormones.")
+    adrenaline = OrganProperty(
+        default=0.0, min_val=0, max_val=100, description="Fight-or-flight hormone.",
+        sensations=[Sensation(">", 50, "[体感: 警觉, 思维锐化]", hysteresis=5)],
+    )
+    cortisol = OrganProperty(
+        default=10.0, min_val=0, max_val=100, description="Stress hormone.",
+        sensations=[Sensation(">", 60, "[体感: 持续的背景压力, 烦躁]", hysteresis=5)],
+    )
+    endorphins = OrganProperty(
+        default=20.0, min_val=0, max_val=100, description="Pain and stress-reducing hormones.",
+        sensations=[Sensation(">", 40, "[体感: 舒适, 平静, 心情愉悦]", hysteresis=5)],
+    )
 
     def __init__(self, engine):
         super().__init__(engine)
@@ -18,15 +27,14 @@ class EndocrinePlugin(OrganPlugin):
         self.cortisol -= 0.1 * tick_duration
         self.endorphins -= 0.5 * tick_duration
 
-    def get_sensations(self) -> list[str]:
-        s = []
-        if self.adrenaline > 50:
-            s.append("[体感: 警觉, 思维锐化]")
-        if self.cortisol > 60:
-            s.append("[体感: 持续的背景压力, 烦躁]")
-        if self.endorphins > 40:
-            s.append("[体感: 舒适, 平静, 心情愉悦]")
-        return s
+    def advance(self, elapsed: float):
+        # Linear decay clamped at zero is exact for any step size.
+        self.update(elapsed)
+
+    def batch_update(self, columns: dict, tick_duration: float):
+        columns["adrenaline"] -= 5.0 * tick_duration
+        columns["cortisol"] -= 0.1 * tick_duration
+        columns["endorphins"] -= 0.5 * tick_duration
 
     def get_state(self) -> dict[str, str]:
         return {
@@ -1,32 +1,45 @@
-from plugins.base import OrganPlugin, OrganProperty
+from plugins.base import OrganPlugin, OrganProperty, Sensation
 
 
 class RespiratoryPlugin(OrganPlugin):
     name = "respiratory"
     display_name = "呼吸系统"
+    reads = ("heart_rate",)
 
-    breathing_rate = OrganProperty(default=16.0, min_val=0, description="Breaths per minute.")
-    oxygen_saturation = OrganProperty(default=98.0, min_val=0, max_val=100, description="Percentage of oxygen in the blood.")
+    breathing_rate = OrganProperty(
+        default=16.0, min_val=0, description="Breaths per minute.",
+        sensations=[Sensation(">", 25, "[体感: 呼吸急促, 喘息]", hysteresis=2)],
+    )
+    oxygen_saturation = OrganProperty(
+        default=98.0, min_val=0, max_val=100, description="Percentage of oxygen in the blood.",
+        sensations=[Sensation("<", 92, "[体感: 缺氧, 头晕]", hysteresis=1)],
+    )
 
     def __init__(self, engine):
         super().__init__(engine)
+        self.circulatory = None
+
+    def bind(self):
+        # Dependency on another plugin, resolved once
+        self.circulatory = self.engine.get_plugin("circulatory")
 
     def update(self, tick_duration: float):
-        # Dependency on another plugin
-        circulatory = self.engine.get_plugin("circulatory")
+        circulatory = self.circulatory
         if circulatory:
             # Breathing rate is affected by heart rate
             base_breathing_rate = 16.0
             heart_rate_effect = (circulatory.heart_rate - circulatory.base_heart_rate) / 5.0
             self.breathing_rate = base_breathing_rate + heart_rate_effect
 
-    def get_sensations(self) -> list[str]:
-        s = []
-        if self.breathing_rate > 25:
-            s.append("[体感: 呼吸急促, 喘息]")
-        if self.oxygen_saturation < 92:
-            s.append("[体感: 缺氧, 头晕]")
-        return s
+    def advance(self, elapsed: float):
+        # Breathing rate follows the heart rate directly, so one evaluation is enough.
+        self.update(elapsed)
+
+    def batch_update(self, columns: dict, tick_duration: float):
+        circulatory = self.circulatory
+        if circulatory:
+            heart_rate_effect = (columns["heart_rate"] - circulatory.base_heart_rate) / 5.0
+            columns["breathing_rate"][:] = 16.0 + heart_rate_effect
 
     def get_state(self) -> dict[str, str]:
         return {
@@ -0,0 +1,226 @@
+import numpy as np
+from engine import BodyEngine
+from impact_plan import ImpactCompiler
+from plugins.base import OrganPlugin
+
+
+class BodyPopulation:
+    """
+    Runs many bodies in lockstep. Every registered OrganProperty is stored as a row of one contiguous
+    NumPy array (a column per property, indexed by body id), so a tick is one vectorized pass per plugin.
+    """
+
+    def __init__(self, capacity: int = 64, clock=None):
+        # A single template engine holds one instance of every plugin. Its per-plugin constants
+        # (base heart rate, digest rate, ...) are shared by every body in the population.
+        self.template = BodyEngine(clock=clock)
+        self.clock = self.template.clock
+        self.property_names: list[str] = []
+        self._owners: list[tuple[OrganPlugin, str]] = []
+        self._plugin_rows: dict[str, slice] = {}
+
+        for name, plugin in self.template.plugins.items():
+            start = len(self.property_names)
+            for prop_name, owner_plugin in self.template.property_map.items():
+                if owner_plugin is plugin:
+                    self.property_names.append(prop_name)
+                    self._owners.append((plugin, prop_name))
+            self._plugin_rows[name] = slice(start, len(self.property_names))
+
+        descriptors = [getattr(type(plugin), prop_name) for plugin, prop_name in self._owners]
+        self._defaults = np.array([float(d.default) for d in descriptors])
+        self._min = np.array([-np.inf if d.min_val is None else float(d.min_val) for d in descriptors])[:, None]
+        self._max = np.array([np.inf if d.max_val is None else float(d.max_val) for d in descriptors])[:, None]
+        self._private_names = [d._private_name for d in descriptors]
+        self._bounds = list(zip(self._min[:, 0].tolist(), self._max[:, 0].tolist()))
+        # Impact handles are row indices into `state`
+        self._impact_compiler = ImpactCompiler({
+            prop_name: (row, plugin.name) for row, (plugin, prop_name) in enumerate(self._owners)
+        })
+
+        # Plugins that override `batch_update` are stepped vectorized; the rest fall back to a per-body loop.
+        self._batched = {
+            name for name, plugin in self.template.plugins.items()
+            if type(plugin).batch_update is not OrganPlugin.batch_update
+        }
+
+        # Declared sensation rules as (plugin name, state row, rule), in plugin then declaration order; plugins
+        # that compute their own sensations are polled instead. Each body keeps its own hysteresis state.
+        rows = {prop_name: row for row, (_, prop_name) in enumerate(self._owners)}
+        self._sensation_rules = []
+        self._polled_sensations = set()
+        for name, plugin in self.template.plugins.items():
+            if type(plugin).get_sensations is not OrganPlugin.get_sensations:
+                self._polled_sensations.add(name)
+                continue
+            self._sensation_rules.extend(
+                (name, rows[prop_name], rule) for prop_name, rule in plugin.sensation_rules() if prop_name in rows
+            )
+        self._sensation_active = np.zeros((len(self._sensation_rules), max(capacity, 1)), dtype=bool)
+
+        # Optional persistence.ImpactLog recording every step and applied impact
+        self.journal = None
+        self.state = np.empty((len(self.property_names), max(capacity, 1)))
+        self.count = 0
+        self.columns: dict[str, np.ndarray] = {}
+        self._bind_columns()
+        self.last_update_time = self.clock.now()
+
+    def _bind_columns(self):
+        """Rebuilds the per-property views over the active bodies."""
+        self.columns = {name: self.state[i, :self.count] for i, name in enumerate(self.property_names)}
+
+    def add_body(self) -> int:
+        """Adds a body initialised to the property defaults and returns its id."""
+        if self.count == self.state.shape[1]:
+            grown = np.empty((self.state.shape[0], self.state.shape[1] * 2))
+            grown[:, :self.count] = self.state[:, :self.count]
+            self.state = grown
+            self._grow_sensations(self.state.shape[1])
+        body_id = self.count
+        self.state[:, body_id] = self._defaults
+        self._sensation_active[:, body_id] = False
+        self.count += 1
+        self._bind_columns()
+        return body_id
+
+    def add_bodies(self, n: int) -> range:
+        """Adds `n` bodies at once and returns their ids."""
+        start = self.count
+        required = start + n
+        if required > self.state.shape[1]:
+            grown = np.empty((self.state.shape[0], max(required, self.state.shape[1] * 2)))
+            grown[:, :start] = self.state[:, :start]
+            self.state = grown
+            self._grow_sensations(self.state.shape[1])
+        self.state[:, start:required] = self._defaults[:, None]
+        self._sensation_active[:, start:required] = False
+        self.count = required
+        self._bind_columns()
+        return range(start, required)
+
+    def _grow_sensations(self, capacity: int):
+        grown = np.zeros((self._sensation_active.shape[0], capacity), dtype=bool)
+        grown[:, :self.count] = self._sensation_active[:, :self.count]
+        self._sensation_active = grown
+
+    def update(self):
+        current_time = self.clock.now()
+        tick_duration = current_time - self.last_update_time
+        self.last_update_time = current_time
+
+        if tick_duration > 0:
+            self.step(tick_duration)
+
+    def step(self, tick_duration: float):
+        """Advances every body by `tick_duration` seconds."""
+        if not self.count:
+            return
+        for name in self.template.update_order:
+            plugin = self.template.plugins[name]
+            if name in self._batched:
+                plugin.batch_update(self.columns, tick_duration)
+            else:
+                for body_id in range(self.count):
+                    self._load(body_id)
+                    plugin.update(tick_duration)
+                    self._store(body_id)
+            rows = self._plugin_rows[name]
+            block = self.state[rows, :self.count]
+            np.clip(block, self._min[rows], self._max[rows], out=block)
+        if self.journal is not None:
+            self.journal.log_tick(self.last_update_time, tick_duration)
+
+    def _load(self, body_id: int):
+        """Writes one body's values into the template plugins, bypassing descriptor clamping."""
+        column = self.state[:, body_id]
+        for (plugin, _), private_name, value in zip(self._owners, self._private_names, column.tolist()):
+            setattr(plugin, private_name, value)
+
+    def _store(self, body_id: int):
+        """Copies the template plugins' values back into one body's column."""
+        self.state[:, body_id] = [getattr(plugin, prop_name) for plugin, prop_name in self._owners]
+
+    def body(self, body_id: int) -> "BodyView":
+        """Returns a BodyEngine-compatible view of a single body."""
+        if not 0 <= body_id < self.count:
+            raise IndexError(f"No body with id {body_id}")
+        return BodyView(self, body_id)
+
+    def get_full_state(self, body_id: int) -> dict[str, dict]:
+        if not 0 <= body_id < self.count:
+            raise IndexError(f"No body with id {body_id}")
+        self._load(body_id)
+        return self.template.get_full_state()
+
+    def get_raw_state(self, body_id: int) -> dict[str, dict[str, float]]:
+        if not 0 <= body_id < self.count:
+            raise IndexError(f"No body with id {body_id}")
+        self._load(body_id)
+        return self.template.get_raw_state()
+
+    def get_all_sensations(self, body_id: int) -> list[str]:
+        """
+        Returns one body's active sensations, as a new list. The template engine's sensation index tracks
+        a single body, so the rules are evaluated here against the body's own hysteresis state, which
+        advances whenever its sensations are read.
+        """
+        if not 0 <= body_id < self.count:
+            raise IndexError(f"No body with id {body_id}")
+        by_plugin: dict[str, list[str]] = {name: [] for name in self.template.plugins}
+        column = self.state[:, body_id]
+        active = self._sensation_active[:, body_id]
+        for rule_id, (plugin_name, row, rule) in enumerate(self._sensation_rules):
+            is_active = rule.is_active(column[row].item(), bool(active[rule_id]))
+            active[rule_id] = is_active
+            if is_active:
+                by_plugin[plugin_name].append(rule.text)
+        if self._polled_sensations:
+            self._load(body_id)
+            for name in self._polled_sensations:
+                by_plugin[name] = list(self.template.plugins[name].get_sensations())
+        return [text for texts in by_plugin.values() for text in texts]
+
+    def apply_impact(self, body_id: int, impact: dict):
+        """Adds a compiled impact to one body's column; an invalid impact raises ImpactError and changes nothing."""
+        # A negative id would silently index another body's column
+        if not 0 <= body_id < self.count:
+            raise IndexError(f"No body with id {body_id}")
+        plan = self._impact_compiler.compile(impact)
+        # Plans only touch a handful of rows; scalar writes beat NumPy fancy indexing at this size
+        state, bounds = self.state, self._bounds
+        for row, delta in zip(plan.handles, plan.deltas):
+            low, high = bounds[row]
+            state[row, body_id] = min(max(state[row, body_id].item() + delta, low), high)
+        if self.journal is not None:
+            self.journal.log_impact(self.clock.now(), impact, body_id)
+
+
+class BodyView:
+    """Exposes one body of a BodyPopulation through the same interface as BodyEngine."""
+
+    def __init__(self, population: BodyPopulation, body_id: int):
+        self.population = population
+        self.body_id = body_id
+
+    @property
+    def plugins(self):
+        return self.population.template.plugins
+
+    def get_full_state(self) -> dict[str, dict]:
+        return self.population.get_full_state(self.body_id)
+
+    def get_raw_state(self) -> dict[str, dict[str, float]]:
+        return self.population.get_raw_state(self.body_id)
+
+    def get_all_sensations(self) -> list[str]:
+        return self.population.get_all_sensations(self.body_id)
+
+    def get_organs_schema(self) -> str:
+        return self.population.template.get_organs_schema()
+
+    def get_impact_schema(self):
+        return self.population.template.get_impact_schema()
+
+    def apply_impact(self, impact: dict):
+        self.population.apply_impact(self.body_id, impact)
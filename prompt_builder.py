@@ -0,0 +1,190 @@
+import re
+import json
+from functools import lru_cache
+
+PERSONA_SYSTEM_PROMPT = """你是一个具有独特个性的女性角色。你名为喵喵。根据当前身体状态、感官体验和发生的事件，生成符合角色个性的对话回应。"""
+
+# Used with `response_format: json_schema`, where the schema itself lists the plugins and attributes
+STRUCTURED_REFLEX_SYSTEM_PROMPT = """你是一个生理反射模拟器。根据当前身体状态和发生的事件，计算此事件对身体造成的【直接、瞬时】的冲击。
+
+按照给定的 JSON Schema 输出每个属性的变化量：正数表示增加，负数表示减少，不受影响的属性为 0。"""
+
+SUMMARY_SYSTEM_PROMPT = """你是一个对话记录员。请将已有的对话摘要与新的对话内容合并为一份新的摘要，使用第三人称，保留人物关系、重要事件、承诺和角色的情绪变化，省略寒暄和重复内容。只输出摘要正文，不超过 {max_tokens} 个字。"""
+
+# CJK characters, kana, hangul and full-width forms; each is roughly one token
+_WIDE_CHARS = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate: one token per CJK character, one per four other characters."""
+    wide = len(text) - len(_WIDE_CHARS.sub("", text))
+    return wide + (len(text) - wide + 3) // 4
+
+
+def encode_state(state) -> str:
+    """Serializes state or impact data as minified JSON to keep prompts small."""
+    return json.dumps(state, separators=(",", ":"), ensure_ascii=False)
+
+
+@lru_cache(maxsize=16)
+def build_reflex_system_prompt(organs_schema: str | None) -> str:
+    """
+    Renders the reflex system prompt. Memoized on the schema text, so the prompt prefix stays
+    byte-identical between turns and provider-side prefix caching can reuse it.
+    """
+    schema_prompt_part = ""
+    if organs_schema:
+        schema_prompt_part = f"""
+[ALLOWED ATTRIBUTES SCHEMA]:
+You MUST strictly adhere to the following schema. Only use the plugin names and attributes provided below.
+{organs_schema}"""
+
+    return f"""你是一个生理反射模拟器。根据当前身体状态和发生的事件，计算此事件对身体造成的【直接、瞬时】的冲击。
+
+{schema_prompt_part}
+【OUTPUT FORMAT REQUIREMENTS】:
+1. MUST only output a JSON object.
+2. All top-level keys in the JSON MUST be plugin names as defined in the schema (e.g., "digestive", "circulatory").
+3. Each plugin object can only contain attributes listed for it in the schema.
+4. Attribute values MUST be numbers giving the change: positive to increase, negative to decrease.
+
+【OUTPUT EXAMPLE】:
+{{
+  "plugin_name_1": {{
+    "attribute_name_1": 10.0,
+    "attribute_name_2": -5.0
+  }},
+  "plugin_name_2": {{
+    "attribute_name_3": 25.5
+  }}
+}}
+
+【START TASK】
+Output ONLY the JSON object representing the state changes. Do not include any explanations.
+"""
+
+
+def build_reflex_messages(
+    event_description: str,
+    current_body_state: dict,
+    organs_schema: str | None = None,
+    structured: bool = False,
+) -> list[dict]:
+    """
+    Builds the chat messages for a reflex call. The system message is the static, cached prefix.
+    `structured` calls send the impact JSON Schema separately, so the prompt leaves the schema out.
+    """
+    user_prompt = f"""[CURRENT BODY STATE]:
+{encode_state(current_body_state)}
+
+[EVENT]:
+\"{event_description}\""""
+
+    return [
+        {"role": "system", "content": STRUCTURED_REFLEX_SYSTEM_PROMPT if structured else build_reflex_system_prompt(organs_schema)},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+@lru_cache(maxsize=16)
+def build_batch_reflex_system_prompt(organs_schema: str | None) -> str:
+    """Renders the system prompt for a batched reflex call covering several bodies. Memoized like the single-body prompt."""
+    schema_prompt_part = ""
+    if organs_schema:
+        schema_prompt_part = f"""
+[ALLOWED ATTRIBUTES SCHEMA]:
+You MUST strictly adhere to the following schema. Only use the plugin names and attributes provided below.
+{organs_schema}"""
+
+    return f"""你是一个生理反射模拟器。你会收到多个互相独立的身体，每个身体都有自己的 id、当前身体状态和发生的事件。分别计算每个事件对对应身体造成的【直接、瞬时】的冲击。
+
+{schema_prompt_part}
+【OUTPUT FORMAT REQUIREMENTS】:
+1. MUST only output a JSON object.
+2. All top-level keys in the JSON MUST be the body ids from the input, and every body id MUST appear exactly once.
+3. Each body's value is an object whose keys MUST be plugin names as defined in the schema (e.g., "digestive", "circulatory"). Use an empty object if the event has no effect.
+4. Each plugin object can only contain attributes listed for it in the schema.
+5. Attribute values MUST be numbers giving the change: positive to increase, negative to decrease.
+
+【OUTPUT EXAMPLE】:
+{{
+  "body_id_1": {{
+    "plugin_name_1": {{
+      "attribute_name_1": 10.0
+    }}
+  }},
+  "body_id_2": {{
+    "plugin_name_2": {{
+      "attribute_name_3": -5.0
+    }}
+  }}
+}}
+
+【START TASK】
+Output ONLY the JSON object representing the state changes. Do not include any explanations.
+"""
+
+
+def build_batch_reflex_messages(entries: list[tuple[str, dict, str]], organs_schema: str | None = None) -> list[dict]:
+    """Builds the chat messages for one reflex call covering several (body id, state, event) entries."""
+    bodies = [{"id": body_id, "state": state, "event": event} for body_id, state, event in entries]
+    return [
+        {"role": "system", "content": build_batch_reflex_system_prompt(organs_schema)},
+        {"role": "user", "content": f"[BODIES]:\n{encode_state(bodies)}"}
+    ]
+
+
+@lru_cache(maxsize=4)
+def build_persona_system_prompt(summary: str = "") -> str:
+    """The persona system prompt plus the conversation summary. Only changes when the summary does."""
+    if not summary:
+        return PERSONA_SYSTEM_PROMPT
+    return f"""{PERSONA_SYSTEM_PROMPT}
+
+[CONVERSATION SUMMARY]:
+{summary}"""
+
+
+def build_persona_messages(
+    event_description: str,
+    reflex_impact: dict | None,
+    final_body_state: dict,
+    sensations: list[str],
+    summary: str = "",
+    history: list[tuple[str, str]] = (),
+) -> list[dict]:
+    """
+    Builds the chat messages for a persona call. The system prompt and summary come first, then the
+    recent (event, reply) turns verbatim, so consecutive calls share a growing cacheable prefix.
+    """
+    sensation_str = "\n".join(sensations) if sensations else "None"
+    impact_str = encode_state(reflex_impact) if reflex_impact else "None"
+
+    user_prompt = f"""[EVENT]:
+"{event_description}"\n
+[ACTION & RESULT]:
+你的身体对该事件的本能反应已经被处理，产生的生理冲击如下：
+{impact_str}
+你的当前身体状态已经体现了这些变化。
+
+[FINAL BODY STATE]:
+{encode_state(final_body_state)}
+
+[CURRENT SENSATIONS]:
+{sensation_str}"""
+
+    messages = [{"role": "system", "content": build_persona_system_prompt(summary)}]
+    for past_event, past_reply in history:
+        messages.append({"role": "user", "content": past_event})
+        messages.append({"role": "assistant", "content": past_reply})
+    messages.append({"role": "user", "content": user_prompt})
+    return messages
+
+
+def build_summary_messages(previous_summary: str, turns: list[tuple[str, str]], max_tokens: int) -> list[dict]:
+    """Builds the chat messages asking for `turns` to be folded into the running conversation summary."""
+    transcript = "\n".join(f"用户: {event}\n角色: {reply}" for event, reply in turns)
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT.format(max_tokens=max_tokens)},
+        {"role": "user", "content": f"[PREVIOUS SUMMARY]:\n{previous_summary or 'None'}\n\n[NEW CONVERSATION]:\n{transcript}"}
+    ]
@@ -0,0 +1,112 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+
+from llm_services import get_reflex_impact, get_batched_reflex_impacts
+from metrics import metrics
+
+load_dotenv()
+
+# How long the first pending event waits for others before its batch is sent
+REFLEX_BATCH_WINDOW = float(os.getenv("REFLEX_BATCH_WINDOW", "0.05"))
+REFLEX_BATCH_MAX = int(os.getenv("REFLEX_BATCH_MAX", "16"))
+
+
+class ReflexBatcher:
+    """
+    Collects reflex requests from many bodies over a short window and resolves them with one completion
+    that carries the organ schema once. Bodies the model leaves out of its answer are retried individually.
+    """
+
+    def __init__(self, window: float = REFLEX_BATCH_WINDOW, max_batch: int = REFLEX_BATCH_MAX):
+        self.window = window
+        self.max_batch = max_batch
+        # Pending entries are grouped by schema, since a batch can only share one
+        self._pending: dict[str | None, list[tuple[str, dict, str, asyncio.Future]]] = {}
+        self._timers: dict[str | None, asyncio.TimerHandle] = {}
+        # The ImpactSchema matching each organ schema, used to validate the answers
+        self._impact_schemas: dict[str | None, object] = {}
+
+    async def submit(
+        self,
+        body_id: str,
+        event_description: str,
+        current_body_state: dict,
+        organs_schema: str | None = None,
+        impact_schema=None,
+    ) -> dict | None:
+        """Queues one body's event and waits for its impact (or None, like get_reflex_impact)."""
+        loop = asyncio.get_running_loop()
+        self._impact_schemas[organs_schema] = impact_schema
+        future = loop.create_future()
+        pending = self._pending.setdefault(organs_schema, [])
+        pending.append((str(body_id), current_body_state, event_description, future))
+
+        if len(pending) >= self.max_batch:
+            self._flush(organs_schema)
+        elif organs_schema not in self._timers:
+            self._timers[organs_schema] = loop.call_later(self.window, self._flush, organs_schema)
+        return await future
+
+    def _flush(self, organs_schema: str | None):
+        timer = self._timers.pop(organs_schema, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(organs_schema, [])
+        if batch:
+            asyncio.ensure_future(self._resolve(batch, organs_schema, self._impact_schemas.get(organs_schema)))
+
+    async def _resolve(self, batch: list[tuple[str, dict, str, asyncio.Future]], organs_schema: str | None, impact_schema=None):
+        # Turns superseded while the batch window was open have cancelled their futures; nobody reads those answers
+        batch = [entry for entry in batch if not entry[3].done()]
+        if not batch:
+            return
+        try:
+            impacts: dict[str, dict] = {}
+            if len(batch) > 1:
+                # Only the first event per body goes into the shared request, since answers are keyed by body id;
+                # a second event for the same body is sent on its own below
+                shared: dict[str, tuple[str, dict, str]] = {}
+                for body_id, state, event, _ in batch:
+                    shared.setdefault(body_id, (body_id, state, event))
+                if len(shared) > 1:
+                    metrics.increment("reflex_batch")
+                    metrics.increment("reflex_batch_bodies", len(shared))
+                    impacts = await get_batched_reflex_impacts(list(shared.values()), organs_schema, impact_schema) or {}
+            await self._deliver(batch, impacts, organs_schema, impact_schema)
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _deliver(
+        self,
+        batch: list[tuple[str, dict, str, asyncio.Future]],
+        impacts: dict[str, dict],
+        organs_schema: str | None,
+        impact_schema=None,
+    ):
+        """Resolves every future, falling back to single-body calls for entries without an answer."""
+        missing = []
+        for entry in batch:
+            body_id, _, _, future = entry
+            if future.done():
+                # Cancelled during the batched call; not worth a call of its own
+                continue
+            if body_id in impacts:
+                future.set_result(impacts.pop(body_id))
+            else:
+                missing.append(entry)
+        if missing and len(batch) > 1:
+            metrics.increment("reflex_batch_fallback", len(missing))
+        results = await asyncio.gather(
+            *(get_reflex_impact(event, state, organs_schema, impact_schema) for _, state, event, _ in missing),
+            return_exceptions=True,
+        )
+        for (_, _, _, future), result in zip(missing, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,145 @@
+import os
+import re
+import json
+import time
+import copy
+import sqlite3
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REFLEX_CACHE_SIZE = int(os.getenv("REFLEX_CACHE_SIZE", "512"))
+REFLEX_CACHE_TTL = float(os.getenv("REFLEX_CACHE_TTL", "3600"))
+# Width of the buckets numeric state values are rounded into before hashing
+REFLEX_CACHE_BUCKET = float(os.getenv("REFLEX_CACHE_BUCKET", "5"))
+# Optional SQLite file that keeps cached impacts across restarts
+REFLEX_CACHE_PATH = os.getenv("REFLEX_CACHE_PATH")
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def normalize_event(event_description: str) -> str:
+    """Normalizes event text so trivially different spellings share a cache entry."""
+    text = unicodedata.normalize("NFKC", event_description).casefold()
+    text = " ".join(text.split())
+    return text.strip(" .!?,;:。！？，；：")
+
+
+def quantize_state(body_state: dict, bucket_size: float) -> dict:
+    """Rounds every number in a get_full_state() snapshot down to its bucket."""
+    def bucket(match: re.Match) -> str:
+        value = float(match.group())
+        return f"{(value // bucket_size) * bucket_size:g}"
+
+    quantized = {}
+    for plugin_name, state in body_state.items():
+        quantized[plugin_name] = {
+            label: _NUMBER.sub(bucket, value) if isinstance(value, str) else value
+            for label, value in state.items()
+        }
+    return quantized
+
+
+class ReflexCache:
+    """
+    An LRU cache with TTL expiry for reflex impacts, optionally backed by SQLite.
+    Keys combine the normalized event, a quantized body state and a hash of the organ schema.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = REFLEX_CACHE_SIZE,
+        ttl: float = REFLEX_CACHE_TTL,
+        bucket_size: float = REFLEX_CACHE_BUCKET,
+        disk_path: str | None = REFLEX_CACHE_PATH,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bucket_size = bucket_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS reflex_cache (key TEXT PRIMARY KEY, impact TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def make_key(self, event_description: str, body_state: dict, organs_schema: str) -> str:
+        """Builds the cache key for an event against a get_full_state() snapshot."""
+        schema_hash = hashlib.sha1(organs_schema.encode("utf-8")).hexdigest()
+        key_material = json.dumps(
+            [normalize_event(event_description), quantize_state(body_state, self.bucket_size), schema_hash],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        """Returns a copy of the cached impact, or None on a miss."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[0] > self.ttl:
+            del self._entries[key]
+            entry = None
+
+        if entry is None and self._db is not None:
+            row = self._db.execute("SELECT impact, created FROM reflex_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                if now - row[1] <= self.ttl:
+                    entry = (row[1], json.loads(row[0]))
+                    self._remember(key, entry)
+                else:
+                    self._db.execute("DELETE FROM reflex_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry[1])
+
+    def put(self, key: str, impact: dict):
+        """Stores an impact under `key`."""
+        entry = (time.time(), copy.deepcopy(impact))
+        self._remember(key, entry)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO reflex_cache (key, impact, created) VALUES (?, ?, ?)",
+                (key, json.dumps(impact, ensure_ascii=False), entry[0]),
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, entry: tuple[float, dict]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops every cached entry, including the on-disk ones."""
+        self._entries.clear()
+        if self._db is not None:
+            self._db.execute("DELETE FROM reflex_cache")
+            self._db.commit()
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
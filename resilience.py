@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import random
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+import httpx
+from dotenv import load_dotenv
+
+from metrics import metrics, RollingHistogram
+
+load_dotenv()
+
+# Seconds a whole turn (reflex + persona) may take, shared by both calls
+TURN_DEADLINE = float(os.getenv("TURN_DEADLINE", "45"))
+# Retries per call on the primary model, before falling back
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Each request earns this fraction of a retry; retries beyond the earned budget are not attempted
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Hedge delay used until enough latency samples exist for a p95
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "3.0"))
+HEDGE_MIN_SAMPLES = 20
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the turn deadline leaves no time for another attempt."""
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+
+_turn_deadline: ContextVar[Deadline | None] = ContextVar("turn_deadline", default=None)
+
+
+# Set by ResilientCaller for each attempt it launches, so the attempt can report when it stops queueing locally
+_on_slot_acquired: ContextVar[Callable[[], None] | None] = ContextVar("on_slot_acquired", default=None)
+
+
+def slot_acquired():
+    """
+    Called by an attempt once it holds a local concurrency slot (e.g. a per-model semaphore). Time
+    queued before this counts toward neither the hedge delay nor the latency samples.
+    """
+    callback = _on_slot_acquired.get()
+    if callback is not None:
+        callback()
+
+
+@contextmanager
+def turn_deadline(seconds: float = TURN_DEADLINE):
+    """Starts a deadline shared by every LLM call made in this context, including tasks created inside it."""
+    token = _turn_deadline.set(Deadline(seconds))
+    try:
+        yield
+    finally:
+        _turn_deadline.reset(token)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transport failures, timeouts, 429/5xx responses and malformed completions are worth another try."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, TimeoutError, json.JSONDecodeError, KeyError))
+
+
+class RetryBudget:
+    """A token bucket that caps retries to a fraction of overall traffic, so retries cannot amplify an outage."""
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, initial: float = 10.0, cap: float = 10.0):
+        self.ratio = ratio
+        self.cap = cap
+        self.tokens = initial
+
+    def record_request(self):
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class ResilientCaller:
+    """
+    Runs LLM requests with hedging, jittered retries under a retry budget, an optional fallback model,
+    and the current turn deadline. One instance per call type keeps its own latency history.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        hedge: bool = HEDGE_ENABLED,
+        max_retries: int = LLM_MAX_RETRIES,
+        budget: RetryBudget | None = None,
+        backoff_base: float = 0.25,
+        backoff_cap: float = 4.0,
+        has_capacity: Callable[[str], bool] | None = None,
+    ):
+        self.name = name
+        # Whether a model has a free local slot; a hedge launched while it has none would only queue behind the original
+        self.has_capacity = has_capacity
+        self.hedge = hedge
+        self.max_retries = max_retries
+        self.budget = budget or RetryBudget()
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.latency = RollingHistogram(256)
+
+    def hedge_delay(self) -> float:
+        """The p95 of recent successful latencies, once there are enough samples."""
+        if len(self.latency.samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return self.latency.quantiles((0.95,))[0.95]
+
+    async def attempts(self, models: list[str], timeout: float) -> AsyncIterator[tuple[str, float]]:
+        """
+        Yields (model, timeout) for every attempt the budget and deadline allow: the primary model
+        `max_retries + 1` times, then each fallback once. Sleeps with full jitter between attempts.
+        """
+        plan = [models[0]] * (self.max_retries + 1) + list(models[1:])
+        deadline = _turn_deadline.get()
+        for i, model in enumerate(plan):
+            if i > 0:
+                if not self.budget.try_spend():
+                    return
+                metrics.increment(f"{self.name}_retries")
+                backoff = random.uniform(0.0, min(self.backoff_cap, self.backoff_base * 2 ** (i - 1)))
+                if deadline is not None:
+                    backoff = min(backoff, max(0.0, deadline.remaining()))
+                await asyncio.sleep(backoff)
+                if model != models[0]:
+                    metrics.increment(f"{self.name}_fallbacks")
+
+            attempt_timeout = timeout if deadline is None else min(timeout, deadline.remaining())
+            if attempt_timeout <= 0:
+                raise DeadlineExceeded(f"{self.name} call ran out of turn time")
+            self.budget.record_request()
+            yield model, attempt_timeout
+
+    async def call(self, attempt: Callable[[str, float], Awaitable[T]], models: list[str], timeout: float) -> T:
+        """Calls `attempt(model, timeout)` until one succeeds, hedging each attempt after the p95 delay."""
+        last_error: Exception | None = None
+        async for model, attempt_timeout in self.attempts(models, timeout):
+            try:
+                return await self._hedged(lambda: asyncio.wait_for(attempt(model, attempt_timeout), attempt_timeout), model)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                last_error = e
+        if last_error is None:
+            raise DeadlineExceeded(f"{self.name} call had no attempts left")
+        raise last_error
+
+    async def _hedged(self, start: Callable[[], Awaitable[T]], model: str) -> T:
+        """
+        Runs `start()`, launches a duplicate if it is slower than the hedge delay, and keeps the first success.
+        Both the delay and the latency sample run from when an attempt got its local slot (see slot_acquired).
+        """
+        # Per attempt, when it started running: its launch, moved forward once it reports a slot
+        in_flight_since: dict[asyncio.Future, list[float]] = {}
+
+        def launch() -> asyncio.Future:
+            since = [time.perf_counter()]
+            token = _on_slot_acquired.set(lambda: since.__setitem__(0, time.perf_counter()))
+            try:
+                # The task copies the current context, callback included
+                task = asyncio.ensure_future(start())
+            finally:
+                _on_slot_acquired.reset(token)
+            in_flight_since[task] = since
+            return task
+
+        first = launch()
+        pending = {first}
+        try:
+            if self.hedge:
+                delay = self.hedge_delay()
+                while (remaining := in_flight_since[first][0] + delay - time.perf_counter()) > 0:
+                    done, _ = await asyncio.wait(pending, timeout=remaining)
+                    if done:
+                        break
+                if not first.done() and (self.has_capacity is None or self.has_capacity(model)):
+                    metrics.increment(f"{self.name}_hedges")
+                    pending.add(launch())
+
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.latency.observe(time.perf_counter() - in_flight_since[task][0])
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancel the loser (or everything, if we were cancelled ourselves)
+            for task in pending:
+                task.cancel()
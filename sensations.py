@@ -0,0 +1,117 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+
+from plugins.base import OrganPlugin, Sensation
+
+
+@dataclass(frozen=True)
+class SensationChange:
+    """Emitted when the set of active sensations changes."""
+    sensations: tuple[str, ...]
+    added: tuple[str, ...]
+    removed: tuple[str, ...]
+
+
+class _WatchedProperty:
+    """
+    One property with declared rules, its sorted rule boundaries, and the open interval between
+    boundaries that its value was last seen in.
+    """
+    __slots__ = ("plugin", "private_name", "boundaries", "rules", "low", "high")
+
+    def __init__(self, plugin: OrganPlugin, private_name: str, rules: list[int], boundaries: list[float]):
+        self.plugin = plugin
+        # Read the stored value directly; the descriptor's __get__ adds nothing here
+        self.private_name = private_name
+        self.rules = rules
+        self.boundaries = boundaries
+        # An empty interval, so the first refresh evaluates every rule
+        self.low = self.high = 0.0
+
+
+class SensationIndex:
+    """
+    Tracks the active sensations of one engine. Declared rules are indexed by a sorted list of threshold
+    boundaries per property, so a property is only re-evaluated after its value leaves the interval
+    between boundaries it was last in. Plugins that override `get_sensations` are polled instead.
+    """
+
+    def __init__(self, plugins: dict[str, OrganPlugin]):
+        self.plugins = plugins
+        self._rules: list[Sensation] = []
+        self._rule_plugins: list[str] = []
+        self._active: list[bool] = []
+        self._watched: list[_WatchedProperty] = []
+        # Last result of every plugin that computes its own sensations
+        self._polled: dict[str, list[str]] = {}
+
+        for name, plugin in plugins.items():
+            if type(plugin).get_sensations is not OrganPlugin.get_sensations:
+                self._polled[name] = []
+                continue
+            by_property: dict[str, list[int]] = {}
+            for prop_name, rule in plugin.sensation_rules():
+                by_property.setdefault(prop_name, []).append(len(self._rules))
+                self._rules.append(rule)
+                self._rule_plugins.append(name)
+                self._active.append(False)
+            for prop_name, rule_ids in by_property.items():
+                boundaries = sorted({
+                    bound for rule_id in rule_ids
+                    for bound in (self._rules[rule_id].threshold, self._rules[rule_id].release_threshold)
+                })
+                private_name = getattr(type(plugin), prop_name)._private_name
+                self._watched.append(_WatchedProperty(plugin, private_name, rule_ids, boundaries))
+
+        self.sensations: list[str] = []
+
+    def refresh(self) -> SensationChange | None:
+        """Re-evaluates properties that crossed a boundary and returns the change, if any."""
+        changed = False
+        active = self._active
+        for watched in self._watched:
+            value = getattr(watched.plugin, watched.private_name)
+            if watched.low < value < watched.high:
+                continue
+            # Crossed (or sits exactly on) a boundary: find the new interval and re-evaluate this property's rules
+            boundaries = watched.boundaries
+            index = bisect_right(boundaries, value)
+            if index and boundaries[index - 1] == value:
+                # On a boundary the open-interval check can never pass, so the next refresh looks again
+                watched.low = watched.high = value
+            else:
+                watched.low = boundaries[index - 1] if index else float("-inf")
+                watched.high = boundaries[index] if index < len(boundaries) else float("inf")
+            for rule_id in watched.rules:
+                is_active = self._rules[rule_id].is_active(value, active[rule_id])
+                if is_active != active[rule_id]:
+                    active[rule_id] = is_active
+                    changed = True
+
+        for name, previous in self._polled.items():
+            current = self.plugins[name].get_sensations()
+            if current != previous:
+                self._polled[name] = current
+                changed = True
+
+        if not changed:
+            return None
+        previous = self.sensations
+        self.sensations = self._collect()
+        if self.sensations == previous:
+            return None
+        return SensationChange(
+            tuple(self.sensations),
+            tuple(s for s in self.sensations if s not in previous),
+            tuple(s for s in previous if s not in self.sensations),
+        )
+
+    def _collect(self) -> list[str]:
+        """Lists the active sensations in plugin order, then declaration order."""
+        by_plugin: dict[str, list[str]] = {name: [] for name in self.plugins}
+        for rule, plugin_name, is_active in zip(self._rules, self._rule_plugins, self._active):
+            if is_active:
+                by_plugin[plugin_name].append(rule.text)
+        for name, polled in self._polled.items():
+            by_plugin[name] = polled
+        return [text for texts in by_plugin.values() for text in texts]
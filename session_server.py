@@ -0,0 +1,413 @@
+"""
+Headless multi-session server. Sessions are sharded by id across worker processes; each worker owns the
+BodyEngine of its sessions, ticks them locally and runs their turns, so one node can use all its cores.
+
+    python session_server.py --port 8765 --workers 4
+
+    POST   /sessions/{id}/events   {"text": "...", "stream": true}   -> server-sent events (reflex, token, done)
+    GET    /sessions/{id}                                           -> {"state": ..., "sensations": [...]}, 404 if unknown
+    DELETE /sessions/{id}
+    GET    /healthz                                                 -> sessions per worker
+
+The front process talks to every worker over a socket pair carrying length-prefixed compact JSON frames.
+"""
+import os
+import sys
+import json
+import zlib
+import struct
+import socket
+import asyncio
+import argparse
+import multiprocessing
+from dataclasses import dataclass, field
+from urllib.parse import unquote
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SESSION_SERVER_HOST = os.getenv("SESSION_SERVER_HOST", "127.0.0.1")
+SESSION_SERVER_PORT = int(os.getenv("SESSION_SERVER_PORT", "8765"))
+SESSION_WORKERS = int(os.getenv("SESSION_WORKERS", str(os.cpu_count() or 1)))
+# Seconds between ticks of every engine a worker owns
+SESSION_TICK_INTERVAL = float(os.getenv("SESSION_TICK_INTERVAL", "1.0"))
+
+_FRAME_HEADER = struct.Struct("<I")
+
+
+async def read_frame(reader: asyncio.StreamReader) -> dict | None:
+    """Reads one length-prefixed JSON frame, or returns None when the peer has gone away."""
+    try:
+        header = await reader.readexactly(_FRAME_HEADER.size)
+        return json.loads(await reader.readexactly(_FRAME_HEADER.unpack(header)[0]))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+
+
+def write_frame(writer: asyncio.StreamWriter, message: dict):
+    data = json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    writer.write(_FRAME_HEADER.pack(len(data)) + data)
+
+
+def shard_for(session_id: str, workers: int) -> int:
+    """Stable across processes and restarts, unlike hash()."""
+    return zlib.crc32(session_id.encode("utf-8")) % workers
+
+
+# ---------------------------------------------------------------------------
+# Worker process
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Session:
+    engine: object
+    memory: object
+    # Turns of one session run one at a time, in arrival order
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Set under `lock` once the session is deleted; turns still queued on the lock are refused
+    closed: bool = False
+
+
+class SessionWorker:
+    """Owns the sessions of one shard and answers the front process's requests."""
+
+    def __init__(self, worker_id: int, tick_interval: float = SESSION_TICK_INTERVAL):
+        from reflex_cache import ReflexCache
+        from reflex_batcher import ReflexBatcher
+
+        self.worker_id = worker_id
+        self.tick_interval = tick_interval
+        self.sessions: dict[str, Session] = {}
+        self.reflex_cache = ReflexCache(disk_path=None)
+        # Reflex calls of this worker's sessions that arrive together share one completion
+        self.batcher = ReflexBatcher()
+        self._writer: asyncio.StreamWriter | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def session(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            from engine import BodyEngine
+            from conversation_memory import ConversationMemory
+            session = self.sessions[session_id] = Session(BodyEngine(), ConversationMemory())
+        return session
+
+    async def serve(self, sock: socket.socket):
+        from llm_services import client_manager
+
+        reader, self._writer = await asyncio.open_connection(sock=sock)
+        await client_manager.open()
+        ticker = asyncio.create_task(self._tick())
+        try:
+            while (message := await read_frame(reader)) is not None:
+                if message["op"] == "shutdown":
+                    break
+                task = asyncio.create_task(self._handle(message))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            ticker.cancel()
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(ticker, *self._tasks, return_exceptions=True)
+            for session in self.sessions.values():
+                await session.memory.close()
+                session.engine.close()
+            await client_manager.close()
+            self.reflex_cache.close()
+            self._writer.close()
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            for session_id, session in list(self.sessions.items()):
+                # One failing engine must not stop the others from ticking
+                try:
+                    session.engine.update()
+                except Exception as e:
+                    print(f"[Worker {self.worker_id} ERROR] Tick failed for session '{session_id}': {e}")
+
+    def _reply(self, request_id: int, **message):
+        write_frame(self._writer, {"req": request_id, **message})
+
+    async def _handle(self, message: dict):
+        request_id = message["req"]
+        try:
+            op = message["op"]
+            if op == "event":
+                await self._run_event(request_id, message["session"], message["text"], message.get("stream", True))
+            elif op == "state":
+                # Reading a session must not create it
+                session = self.sessions.get(message["session"])
+                if session is None:
+                    self._reply(request_id, type="not_found", message=f"No session '{message['session']}'")
+                else:
+                    self._reply(request_id, type="state", state=session.engine.get_raw_state(), sensations=session.engine.get_all_sensations())
+            elif op == "close":
+                session = self.sessions.pop(message["session"], None)
+                if session is not None:
+                    # Wait for the running turn to finish with the engine and memory first
+                    async with session.lock:
+                        session.closed = True
+                        await session.memory.close()
+                        session.engine.close()
+                self._reply(request_id, type="closed", existed=session is not None)
+            elif op == "stats":
+                self._reply(request_id, type="stats", worker=self.worker_id, pid=os.getpid(), sessions=len(self.sessions))
+            else:
+                self._reply(request_id, type="error", message=f"Unknown op '{op}'")
+        except Exception as e:
+            self._reply(request_id, type="error", message=str(e))
+        await self._writer.drain()
+
+    async def _run_event(self, request_id: int, session_id: str, text: str, stream: bool):
+        from pipeline import resolve_reflex, generate_persona
+        from resilience import turn_deadline
+
+        session = self.session(session_id)
+        async with session.lock:
+            if session.closed:
+                self._reply(request_id, type="error", message=f"Session '{session_id}' was deleted")
+                return
+            with turn_deadline():
+                impact, cache_hit = await resolve_reflex(
+                    session.engine, text, self.reflex_cache, self.batcher, session_id
+                )
+                self._reply(request_id, type="reflex", impact=impact, cache_hit=cache_hit)
+
+                def on_token(token: str):
+                    self._reply(request_id, type="token", text=token)
+
+                reply = await generate_persona(
+                    session.engine, text, impact, on_token if stream else None, stream, session.memory
+                )
+        self._reply(request_id, type="done", reply=reply, state=session.engine.get_raw_state(), sensations=session.engine.get_all_sensations())
+
+
+def _worker_main(worker_id: int, sock: socket.socket, tick_interval: float):
+    try:
+        asyncio.run(SessionWorker(worker_id, tick_interval).serve(sock))
+    except KeyboardInterrupt:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Front process
+# ---------------------------------------------------------------------------
+
+class WorkerClient:
+    """The front process's end of one worker's channel. Responses are routed to per-request queues."""
+
+    def __init__(self, process: multiprocessing.Process, sock: socket.socket):
+        self.process = process
+        self.sock = sock
+        self._writer: asyncio.StreamWriter | None = None
+        self._pending: dict[int, asyncio.Queue] = {}
+        self._next_id = 0
+        self._reader_task: asyncio.Task | None = None
+        # False once the worker's end of the channel has closed; requests then fail immediately
+        self.alive = True
+
+    async def start(self):
+        reader, self._writer = await asyncio.open_connection(sock=self.sock)
+        self._reader_task = asyncio.create_task(self._read_loop(reader))
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        while (message := await read_frame(reader)) is not None:
+            queue = self._pending.get(message["req"])
+            if queue is not None:
+                queue.put_nowait(message)
+        # The worker died; fail everything still waiting on it, and everything sent from now on
+        self.alive = False
+        print(f"[Server ERROR] Worker process {self.process.pid} exited; its sessions are unavailable")
+        for queue in self._pending.values():
+            queue.put_nowait({"type": "error", "message": "worker exited"})
+
+    async def request(self, message: dict):
+        """Sends a request and yields its responses until a final one (anything but reflex/token)."""
+        if not self.alive:
+            yield {"type": "error", "message": "worker exited"}
+            return
+        self._next_id += 1
+        request_id = self._next_id
+        queue: asyncio.Queue = asyncio.Queue()
+        self._pending[request_id] = queue
+        try:
+            try:
+                write_frame(self._writer, {"req": request_id, **message})
+                await self._writer.drain()
+            except ConnectionError:
+                self.alive = False
+                yield {"type": "error", "message": "worker exited"}
+                return
+            while True:
+                response = await queue.get()
+                yield response
+                if response["type"] not in ("reflex", "token"):
+                    return
+        finally:
+            del self._pending[request_id]
+
+    async def call(self, message: dict) -> dict:
+        async for response in self.request(message):
+            last = response
+        return last
+
+    async def stop(self):
+        if self._writer is not None:
+            if self.alive:
+                try:
+                    write_frame(self._writer, {"op": "shutdown"})
+                    await self._writer.drain()
+                except ConnectionError:
+                    pass
+            self._writer.close()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+
+
+class SessionServer:
+    """HTTP/1.1 front end that routes each session to its worker and relays the worker's responses."""
+
+    def __init__(self, workers: list[WorkerClient]):
+        self.workers = workers
+
+    def worker_for(self, session_id: str) -> WorkerClient:
+        return self.workers[shard_for(session_id, len(self.workers))]
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                keep_alive = await self._route(writer, method, path.split("?", 1)[0], body)
+                if not keep_alive or headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, writer: asyncio.StreamWriter, method: str, path: str, body: bytes) -> bool:
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if method == "GET" and parts == ["healthz"]:
+            stats = await asyncio.gather(*(worker.call({"op": "stats"}) for worker in self.workers))
+            await self._send_json(writer, 200, {"workers": [{k: v for k, v in s.items() if k not in ("req", "type")} for s in stats]})
+            return True
+        if len(parts) < 2 or parts[0] != "sessions" or not parts[1]:
+            await self._send_json(writer, 404, {"error": f"Unknown route {method} {path}"})
+            return True
+
+        session_id = parts[1]
+        worker = self.worker_for(session_id)
+        if method == "GET" and len(parts) == 2:
+            response = await worker.call({"op": "state", "session": session_id})
+            await self._send_worker_response(writer, response)
+            return True
+        if method == "DELETE" and len(parts) == 2:
+            response = await worker.call({"op": "close", "session": session_id})
+            await self._send_worker_response(writer, response)
+            return True
+        if method == "POST" and parts[2:] == ["events"]:
+            try:
+                payload = json.loads(body or b"{}")
+                text = payload["text"]
+            except (ValueError, KeyError, TypeError):
+                await self._send_json(writer, 400, {"error": "Expected a JSON body with a 'text' field"})
+                return True
+            stream = payload.get("stream", True)
+            message = {"op": "event", "session": session_id, "text": text, "stream": stream}
+            if not stream:
+                await self._send_worker_response(writer, await worker.call(message))
+                return True
+            await self._stream_event(writer, worker, message)
+            # The SSE response is delimited by closing the connection
+            return False
+
+        await self._send_json(writer, 405, {"error": f"Unsupported method {method} for {path}"})
+        return True
+
+    async def _stream_event(self, writer: asyncio.StreamWriter, worker: WorkerClient, message: dict):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+            b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n"
+        )
+        async for response in worker.request(message):
+            data = json.dumps({k: v for k, v in response.items() if k not in ("req", "type")}, separators=(",", ":"), ensure_ascii=False)
+            writer.write(f"event: {response['type']}\ndata: {data}\n\n".encode("utf-8"))
+            await writer.drain()
+
+    async def _send_worker_response(self, writer: asyncio.StreamWriter, response: dict):
+        status = {"error": 500, "not_found": 404}.get(response.get("type"), 200)
+        await self._send_json(writer, status, {k: v for k, v in response.items() if k not in ("req", "type")})
+
+    @staticmethod
+    async def _send_json(writer: asyncio.StreamWriter, status: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}.get(status, "")
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+        )
+        await writer.drain()
+
+
+def start_workers(count: int, tick_interval: float) -> list[WorkerClient]:
+    """Starts the worker processes; call before the front process's event loop exists."""
+    context = multiprocessing.get_context("spawn")
+    clients = []
+    for worker_id in range(count):
+        front_sock, worker_sock = socket.socketpair()
+        process = context.Process(target=_worker_main, args=(worker_id, worker_sock, tick_interval), daemon=True)
+        process.start()
+        worker_sock.close()
+        clients.append(WorkerClient(process, front_sock))
+    return clients
+
+
+async def serve(host: str, port: int, workers: list[WorkerClient]):
+    for worker in workers:
+        await worker.start()
+    server = SessionServer(workers)
+    listener = await asyncio.start_server(server.handle_connection, host, port)
+    print(f"Session server listening on http://{host}:{port} with {len(workers)} worker(s)")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await asyncio.gather(*(worker.stop() for worker in workers), return_exceptions=True)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="ChatRPG multi-session server")
+    parser.add_argument("--host", default=SESSION_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SESSION_SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SESSION_WORKERS, help="worker processes; sessions are sharded across them")
+    parser.add_argument("--tick-interval", type=float, default=SESSION_TICK_INTERVAL, help="seconds between engine ticks")
+    args = parser.parse_args(argv)
+
+    workers = start_workers(max(1, args.workers), args.tick_interval)
+    try:
+        asyncio.run(serve(args.host, args.port, workers))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
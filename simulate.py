@@ -0,0 +1,198 @@
+"""
+Headless, faster-than-realtime simulation of a body or a population on a virtual clock.
+
+    python simulate.py --duration 12h --events events.json --output trajectory.csv
+    python simulate.py --duration 2h --bodies 1000 --output trajectory.npz
+
+The events file is a JSON list of scripted impacts, applied through `apply_impact` when the
+simulated time reaches `at` (and again every `every`, if given):
+
+    [{"at": "30m", "impact": {"digestive": {"fullness": "+=40"}}},
+     {"at": "1h", "every": "4h", "impact": {"endocrine": {"cortisol": "+=20"}}, "bodies": [0, 1]}]
+
+Trajectories are sampled every `--sample-every` simulated seconds and written as CSV, JSON lines
+or a NumPy .npz archive, depending on the output file extension.
+"""
+import re
+import sys
+import csv
+import json
+import time
+import argparse
+import numpy as np
+
+from clock import VirtualClock
+from engine import BodyEngine
+from population import BodyPopulation
+from persistence import property_layout, population_property_names
+
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d*)?|\.\d+)\s*([smhd]?)\s*$")
+_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(value) -> float:
+    """Parses seconds given as a number or a string like "90", "15m", "6h" or "2d"."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _DURATION.match(str(value))
+    if match is None:
+        raise ValueError(f"Invalid duration '{value}'")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+
+def load_events(path: str | None) -> list[dict]:
+    """Reads the event script and returns its events with `at`/`every` in seconds."""
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as f:
+        raw_events = json.load(f)
+    events = []
+    for event in raw_events:
+        events.append({
+            "at": parse_duration(event["at"]),
+            "every": parse_duration(event["every"]) if event.get("every") else None,
+            "impact": event["impact"],
+            "bodies": event.get("bodies"),
+        })
+    return events
+
+
+def event_times(event: dict, duration: float) -> list[float]:
+    if not event["every"]:
+        return [event["at"]] if event["at"] <= duration else []
+    return list(np.arange(event["at"], duration + 1e-9, event["every"]))
+
+
+class Simulation:
+    """Drives a BodyEngine (one body) or a BodyPopulation on a VirtualClock and samples its state."""
+
+    def __init__(self, bodies: int = 1, lazy: bool = False, population: bool = False):
+        self.clock = VirtualClock()
+        if bodies > 1 or population:
+            self.target = BodyPopulation(capacity=bodies, clock=self.clock)
+            self.target.add_bodies(bodies)
+            self.property_names = population_property_names(self.target)
+        else:
+            self.target = BodyEngine(lazy=lazy, manifest_path=None, clock=self.clock)
+            self._layout = property_layout(self.target)
+            self.property_names = [name for name, _, _ in self._layout]
+        self.is_population = isinstance(self.target, BodyPopulation)
+        self.times: list[float] = []
+        self.samples: list[np.ndarray] = []
+        self.sensations: list[list[str]] = []
+
+    def sample(self):
+        """Records the current values as a (property, body) array."""
+        self.times.append(self.clock.now())
+        if self.is_population:
+            self.samples.append(self.target.state[:, :self.target.count].copy())
+            return
+        if self.target.lazy:
+            self.target.fast_forward()
+        self.samples.append(np.array([[getattr(plugin, private_name)] for _, plugin, private_name in self._layout]))
+        self.sensations.append(list(self.target.get_all_sensations()))
+
+    def apply(self, impact: dict, bodies: list[int] | None):
+        if not self.is_population:
+            self.target.apply_impact(impact)
+            return
+        for body_id in (bodies if bodies is not None else range(self.target.count)):
+            self.target.apply_impact(body_id, impact)
+
+    def run(self, duration: float, dt: float, sample_every: float, events: list[dict]):
+        """Advances `duration` simulated seconds in steps of at most `dt`, stopping exactly at events and samples."""
+        # Neither would ever move the clock or the next sample forward
+        if dt <= 0:
+            raise ValueError(f"dt must be positive, got {dt}")
+        if sample_every <= 0:
+            raise ValueError(f"sample_every must be positive, got {sample_every}")
+        schedule = sorted(
+            ((at, i) for i, event in enumerate(events) for at in event_times(event, duration)),
+            key=lambda item: item[0],
+        )
+        next_event = 0
+        next_sample = 0.0
+        start = self.clock.now()
+        while True:
+            elapsed = self.clock.now() - start
+            while next_event < len(schedule) and schedule[next_event][0] <= elapsed + 1e-9:
+                event = events[schedule[next_event][1]]
+                self.apply(event["impact"], event["bodies"])
+                next_event += 1
+            if elapsed >= next_sample - 1e-9:
+                self.sample()
+                next_sample += sample_every
+            if elapsed >= duration - 1e-9:
+                break
+            stops = [duration, next_sample]
+            if next_event < len(schedule):
+                stops.append(schedule[next_event][0])
+            self.clock.advance(min(dt, min(stops) - elapsed))
+            # A lazy engine integrates the whole gap when it is next read
+            if self.is_population or not self.target.lazy:
+                self.target.update()
+
+    def write(self, path: str):
+        """Writes the sampled trajectory; the format follows the extension (.csv, .jsonl or .npz)."""
+        values = np.stack(self.samples) if self.samples else np.zeros((0, len(self.property_names), 1))
+        if path.endswith(".npz"):
+            np.savez_compressed(path, times=np.array(self.times), values=values, property_names=np.array(self.property_names))
+            return
+        bodies = values.shape[2]
+        if path.endswith(".jsonl"):
+            with open(path, "w", encoding="utf-8") as f:
+                for i, t in enumerate(self.times):
+                    for body_id in range(bodies):
+                        row = {"time": t, "body": body_id, **dict(zip(self.property_names, values[i, :, body_id].tolist()))}
+                        if self.sensations:
+                            row["sensations"] = self.sensations[i]
+                        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            return
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["time", "body", *self.property_names] + (["sensations"] if self.sensations else []))
+            for i, t in enumerate(self.times):
+                for body_id in range(bodies):
+                    row = [t, body_id, *values[i, :, body_id].tolist()]
+                    if self.sensations:
+                        row.append(" ".join(self.sensations[i]))
+                    writer.writerow(row)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run ChatRPG body dynamics headlessly on a virtual clock")
+    parser.add_argument("--duration", default="1h", help="simulated time, e.g. 3600, 90m, 12h, 2d")
+    parser.add_argument("--dt", default="1", help="longest simulated step between updates")
+    parser.add_argument("--sample-every", default="1m", help="simulated time between trajectory samples")
+    parser.add_argument("--bodies", type=int, default=1, help="number of bodies; more than one simulates a BodyPopulation")
+    parser.add_argument("--population", action="store_true", help="use a BodyPopulation even for a single body")
+    parser.add_argument("--lazy", action="store_true", help="integrate a single body lazily between events and samples")
+    parser.add_argument("--events", help="JSON file of scripted impacts")
+    parser.add_argument("--output", help="trajectory file (.csv, .jsonl or .npz)")
+    args = parser.parse_args(argv)
+
+    duration = parse_duration(args.duration)
+    dt, sample_every = parse_duration(args.dt), parse_duration(args.sample_every)
+    if dt <= 0:
+        parser.error("--dt must be positive")
+    if sample_every <= 0:
+        parser.error("--sample-every must be positive")
+    simulation = Simulation(args.bodies, lazy=args.lazy, population=args.population)
+    events = load_events(args.events)
+
+    started = time.perf_counter()
+    simulation.run(duration, dt, sample_every, events)
+    wall = time.perf_counter() - started
+
+    print(
+        f"Simulated {duration:,.0f}s for {args.bodies} body(s) in {wall:.2f}s "
+        f"({duration / wall if wall else float('inf'):,.0f}x realtime), {len(simulation.times)} samples"
+    )
+    if args.output:
+        simulation.write(args.output)
+        print(f"Trajectory written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+import os
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Tick the engine on its own thread and let the UI and prompts read published snapshots
+ENGINE_THREAD = os.getenv("ENGINE_THREAD", "false").lower() in ("1", "true", "yes")
+ENGINE_TICK_INTERVAL = float(os.getenv("ENGINE_TICK_INTERVAL", "1.0"))
+
+
+@dataclass(frozen=True)
+class BodySnapshot:
+    """
+    The body as of one tick. Snapshots are never modified after they are published, so readers on any
+    thread can hold one without locking; the dicts inside must be treated as read-only too.
+    """
+    version: int
+    timestamp: float
+    # As returned by BodyEngine.get_raw_state
+    raw_state: dict[str, dict[str, float]]
+    # plugin name -> plugin.get_state(), what the organ widgets display
+    plugin_states: dict[str, dict]
+    sensations: tuple[str, ...]
+
+
+class EngineTicker:
+    """
+    Runs a BodyEngine's ticks on a dedicated thread. The thread is the only one that touches plugin
+    state while it runs: impacts are queued to it, and after every tick or impact it publishes a new
+    BodySnapshot by replacing `snapshot`, which readers pick up with a single attribute read.
+    """
+
+    def __init__(self, engine, interval: float = ENGINE_TICK_INTERVAL, on_tick: Callable[[], None] | None = None):
+        self.engine = engine
+        self.interval = interval
+        # Called on the ticker thread after every tick, while plugin state is consistent (e.g. BodyHistory.record)
+        self.on_tick = on_tick
+        # Held while the thread mutates the engine; take it to read or write plugins from another thread
+        self.lock = threading.Lock()
+        self.snapshot = self._build_snapshot(0)
+        self._impacts: queue.SimpleQueue[tuple[dict, Future]] = queue.SimpleQueue()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+        # Whether the thread is accepting impacts; checked and changed under `_submit_lock`, so an impact
+        # is either queued while the thread will still drain it, or applied by the caller
+        self._running = False
+        self._submit_lock = threading.Lock()
+
+    def start(self):
+        self.engine.last_update_time = self.engine.clock.now()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="engine-ticker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the thread after its current tick; impacts still queued are applied first."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit_impact(self, impact: dict) -> Future:
+        """
+        Queues an impact for the ticker thread. The future resolves to the first snapshot that includes
+        it, or raises ImpactError if the impact is invalid.
+        """
+        future = Future()
+        with self._submit_lock:
+            if self._running:
+                self._impacts.put((impact, future))
+                self._wake.set()
+                return future
+        # Not running (yet, any more, or after a fatal error): apply in the caller, which then owns the engine
+        self._apply(impact, future)
+        if not future.done():
+            try:
+                future.set_result(self._publish())
+            except Exception as e:
+                future.set_exception(e)
+        return future
+
+    def _run(self):
+        try:
+            self._loop()
+        except BaseException as e:
+            print(f"[Ticker CRITICAL] Engine thread stopped: {e}")
+        finally:
+            with self._submit_lock:
+                self._running = False
+            # Nothing will drain the queue any more; fail whatever is still in it
+            while True:
+                try:
+                    _, future = self._impacts.get_nowait()
+                except queue.Empty:
+                    break
+                if not future.done():
+                    future.set_exception(RuntimeError("The engine thread stopped before applying this impact"))
+
+    def _loop(self):
+        next_tick = self.engine.clock.now() + self.interval
+        while True:
+            self._wake.wait(max(0.0, next_tick - self.engine.clock.now()))
+            self._wake.clear()
+            applied = self._drain_impacts()
+            ticked = self.engine.clock.now() >= next_tick
+            if ticked:
+                # A failing plugin or history write costs one tick, not the thread
+                try:
+                    with self.lock:
+                        self.engine.update()
+                        if self.on_tick is not None:
+                            self.on_tick()
+                except Exception as e:
+                    print(f"[Ticker ERROR] Tick failed: {e}")
+                next_tick += self.interval
+                # After a stall, skip the missed ticks; update() integrates the whole gap anyway
+                next_tick = max(next_tick, self.engine.clock.now())
+            if applied or ticked:
+                try:
+                    snapshot = self._publish()
+                except Exception as e:
+                    print(f"[Ticker ERROR] Could not publish a snapshot: {e}")
+                    for future in applied:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for future in applied:
+                        if not future.done():
+                            future.set_result(snapshot)
+            if self._stopping and self._impacts.empty():
+                return
+
+    def _drain_impacts(self) -> list[Future]:
+        applied = []
+        while True:
+            try:
+                impact, future = self._impacts.get_nowait()
+            except queue.Empty:
+                return applied
+            self._apply(impact, future)
+            applied.append(future)
+
+    def _apply(self, impact: dict, future: Future):
+        try:
+            with self.lock:
+                self.engine.apply_impact(impact)
+        except Exception as e:
+            future.set_exception(e)
+
+    def _publish(self) -> BodySnapshot:
+        with self.lock:
+            snapshot = self._build_snapshot(self.snapshot.version + 1)
+        # A plain attribute assignment is atomic; readers see the old snapshot or the new one, never a mix
+        self.snapshot = snapshot
+        return snapshot
+
+    def _build_snapshot(self, version: int) -> BodySnapshot:
+        engine = self.engine
+        return BodySnapshot(
+            version=version,
+            timestamp=engine.clock.now(),
+            raw_state=engine.get_raw_state(),
+            plugin_states={name: plugin.get_state() for name, plugin in engine.plugins.items()},
+            sensations=tuple(engine.get_all_sensations()),
+        )
+
+
+class SnapshotView:
+    """
+    The engine interface the pipeline uses (see pipeline.resolve_reflex), served from the ticker's
+    latest snapshot. Reads never wait for a tick; `apply_impact` returns an awaitable that completes
+    once the impact is part of the published snapshot.
+    """
+
+    def __init__(self, ticker: EngineTicker):
+        self.ticker = ticker
+        self.engine = ticker.engine
+
+    @property
+    def snapshot(self) -> BodySnapshot:
+        return self.ticker.snapshot
+
+    @property
+    def plugins(self):
+        return self.engine.plugins
+
+    @property
+    def property_map(self):
+        return self.engine.property_map
+
+    def get_raw_state(self) -> dict[str, dict[str, float]]:
+        return self.ticker.snapshot.raw_state
+
+    def get_full_state(self) -> dict[str, dict]:
+        return {name.capitalize(): state for name, state in self.ticker.snapshot.plugin_states.items()}
+
+    def get_all_sensations(self) -> list[str]:
+        return list(self.ticker.snapshot.sensations)
+
+    def get_organs_schema(self) -> str:
+        # Only changes when plugins register, which happens before the ticker starts
+        return self.engine.get_organs_schema()
+
+    def get_impact_schema(self):
+        return self.engine.get_impact_schema()
+
+    def apply_impact(self, impact: dict):
+        return asyncio.wrap_future(self.ticker.submit_impact(impact))
@@ -1,5 +1,22 @@
 from textual.widgets import Static
 
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+# Characters per sparkline drawn under the organ state
+SPARKLINE_WIDTH = 24
+
+
+def sparkline(values) -> str:
+    """Renders a sequence of numbers as a one-line block-character sparkline."""
+    values = [float(v) for v in values]
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    if high - low < 1e-9:
+        return SPARK_CHARS[0] * len(values)
+    scale = (len(SPARK_CHARS) - 1) / (high - low)
+    return "".join(SPARK_CHARS[round((v - low) * scale)] for v in values)
+
+
 class OrganWidget(Static):
     """The default widget to display the state of a single organ system."""
     
@@ -7,11 +24,51 @@ class OrganWidget(Static):
         super().__init__(*args, **kwargs)
         self.system_name = system_name
         self.border_title = system_name
+        self._state: dict = {}
+        self._trends: dict[str, str] = {}
 
     def update_state(self, data: dict):
         """A standardized method to update the widget's content."""
+        self._state = data
+        self._render_content()
+
+    def update_trends(self, trends: dict[str, str]):
+        """Sets the sparklines (property name -> rendered sparkline) shown below the state."""
+        # History changes every tick, but the rendered characters usually do not
+        if trends == self._trends:
+            return
+        self._trends = trends
+        self._render_content()
+
+    def _render_content(self):
         content = ""
-        for key, value in data.items():
+        for key, value in self._state.items():
             content += f"{key}: {value}\n"
+        for prop_name, line in self._trends.items():
+            content += f"[dim]{prop_name}[/dim] {line}\n"
         self.update(content)
 
+
+class MetricsWidget(Static):
+    """A panel showing rolling per-stage latency percentiles and LLM token usage."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.border_title = "Metrics"
+
+    def update_metrics(self, snapshot: dict):
+        """Renders a MetricsRegistry snapshot."""
+        content = f"{'stage':<28}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}\n"
+        for stage, stats in sorted(snapshot["stages"].items()):
+            content += (
+                f"{stage:<28}{stats['count']:>6}"
+                f"{stats['p50'] * 1000:>9.2f}{stats['p95'] * 1000:>9.2f}{stats['p99'] * 1000:>9.2f}\n"
+            )
+        if snapshot["counters"]:
+            content += "\n" + ", ".join(f"{name}: {value}" for name, value in sorted(snapshot["counters"].items())) + "\n"
+        for model, tokens in snapshot["tokens"].items():
+            content += (
+                f"\n{model}: {tokens['requests']} req, "
+                f"{tokens['prompt_tokens']} prompt / {tokens['completion_tokens']} completion tokens"
+            )
+        self.update(content)
@@ -0,0 +1,96 @@
+import os
+import asyncio
+from typing import Awaitable, Callable
+from dotenv import load_dotenv
+
+from pipeline import resolve_reflex
+from reflex_cache import ReflexCache
+from resilience import turn_deadline
+
+load_dotenv()
+
+# Events submitted within this many seconds of each other share one reflex call
+TURN_COALESCE_WINDOW = float(os.getenv("TURN_COALESCE_WINDOW", "0.3"))
+
+
+class TurnScheduler:
+    """
+    Processes submitted events without pausing the engine. Bursts of events are coalesced into a
+    single reflex call, impacts are applied one batch at a time in submission order, and a persona
+    generation still running when the next batch's impact lands is cancelled as superseded.
+    """
+
+    def __init__(
+        self,
+        engine,
+        handle_reflex: Callable[[list[str], dict | None, bool], None],
+        handle_persona: Callable[[str, dict | None], Awaitable[None]],
+        handle_error: Callable[[Exception], None],
+        reflex_cache: ReflexCache | None = None,
+        coalesce_window: float = TURN_COALESCE_WINDOW,
+    ):
+        self.engine = engine
+        self.handle_reflex = handle_reflex
+        self.handle_persona = handle_persona
+        self.handle_error = handle_error
+        self.reflex_cache = reflex_cache
+        self.coalesce_window = coalesce_window
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._worker: asyncio.Task | None = None
+        self._persona_task: asyncio.Task | None = None
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for task in (self._worker, self._persona_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._worker = None
+        self._persona_task = None
+
+    def submit(self, user_input: str):
+        """Queues an event; it is processed together with any others arriving within the coalesce window."""
+        self._queue.put_nowait(user_input)
+
+    async def _next_batch(self) -> list[str]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.coalesce_window
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Anything already queued joins the batch as well
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            events = await self._next_batch()
+            event_description = "\n".join(events)
+            # The persona task copies this context, so both calls share one turn deadline
+            with turn_deadline():
+                # Any failure is reported and the loop moves on, so later submissions are still processed
+                try:
+                    reflex_impact, cache_hit = await resolve_reflex(self.engine, event_description, self.reflex_cache)
+                    self.handle_reflex(events, reflex_impact, cache_hit)
+                    # The previous reply was generated against a body state that no longer exists
+                    if self._persona_task is not None and not self._persona_task.done():
+                        self._persona_task.cancel()
+                        await asyncio.gather(self._persona_task, return_exceptions=True)
+                    self._persona_task = asyncio.create_task(self._persona(event_description, reflex_impact))
+                except Exception as e:
+                    self.handle_error(e)
+
+    async def _persona(self, event_description: str, reflex_impact: dict | None):
+        try:
+            await self.handle_persona(event_description, reflex_impact)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.handle_error(e)
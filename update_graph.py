@@ -0,0 +1,56 @@
+from plugins.base import OrganPlugin
+
+
+class PluginCycleError(ValueError):
+    """Raised when the plugins' declared reads and writes form a cycle, so no update order satisfies them."""
+
+
+def plugin_writes(plugin: OrganPlugin, property_map: dict[str, OrganPlugin]) -> set[str]:
+    """The properties a plugin's update writes: its declared `writes`, or else the properties it owns."""
+    if type(plugin).writes is not None:
+        return set(type(plugin).writes)
+    return {prop_name for prop_name, owner in property_map.items() if owner is plugin}
+
+
+def update_levels(plugins: dict[str, OrganPlugin], property_map: dict[str, OrganPlugin]) -> list[list[str]]:
+    """
+    Orders plugins so each one updates after every plugin writing a property it reads. Returns the
+    order as levels: plugins within a level neither read what the others write nor write the same
+    properties, so a level can run in any order or in parallel. Ties are broken by plugin name, so the
+    order does not depend on the order plugins were loaded in.
+    """
+    writes = {name: plugin_writes(plugin, property_map) for name, plugin in plugins.items()}
+    depends_on: dict[str, set[str]] = {}
+    for name, plugin in plugins.items():
+        reads = set(type(plugin).reads)
+        for prop_name in sorted(reads - property_map.keys()):
+            print(f"[Engine WARNING] Plugin '{name}' reads unknown property '{prop_name}'.")
+        depends_on[name] = {writer for writer in plugins if writer != name and reads & writes[writer]}
+
+    levels = []
+    remaining = dict(depends_on)
+    while remaining:
+        ready = sorted(name for name, dependencies in remaining.items() if not dependencies & remaining.keys())
+        if not ready:
+            raise PluginCycleError(f"Plugin update dependencies form a cycle: {' -> '.join(_find_cycle(remaining))}")
+        # Two writers of the same property may not share a level; the later one moves to the next
+        level, written = [], set()
+        for name in ready:
+            if writes[name] & written:
+                continue
+            level.append(name)
+            written |= writes[name]
+        levels.append(level)
+        for name in level:
+            del remaining[name]
+    return levels
+
+
+def _find_cycle(depends_on: dict[str, set[str]]) -> list[str]:
+    """Follows unresolved dependencies until a plugin repeats; every plugin left has one."""
+    path = [min(depends_on)]
+    while True:
+        following = min(depends_on[path[-1]] & depends_on.keys())
+        if following in path:
+            return path[path.index(following):] + [following]
+        path.append(following)